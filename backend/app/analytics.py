@@ -0,0 +1,121 @@
+import os
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import engine, PageViewBucket
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Hourly view buckets older than this are folded into daily totals by `cli compact`.
+VIEW_HOURLY_RETENTION_DAYS = int(os.getenv("VIEW_HOURLY_RETENTION_DAYS", "14"))
+# Longest range one stats request may cover, per granularity (bounds the response size).
+MAX_STATS_RANGE = {"hour": timedelta(days=31), "day": timedelta(days=366)}
+
+
+def truncate(moment: datetime, period: str) -> datetime:
+    """Start of the hour or day containing `moment`."""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if period == "day" else moment
+
+
+def _upsert(buckets: Dict[Tuple[str, str, datetime], int]):
+    """An INSERT adding `views` to existing buckets, plus its parameters."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = PageViewBucket.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.page_id, table.c.period, table.c.bucket_start],
+        set_={"views": table.c.views + stmt.excluded.views},
+    )
+    params = [
+        {"page_id": page_id, "period": period, "bucket_start": bucket_start, "views": views}
+        for (page_id, period, bucket_start), views in buckets.items()
+    ]
+    return stmt, params
+
+
+def add_hourly_views(conn, views: Dict[Tuple[str, datetime], int]) -> None:
+    """Adds views keyed by (page_id, hour start) to their hourly buckets, within `conn`'s transaction."""
+    if views:
+        conn.execute(*_upsert({(page_id, "hour", hour): count for (page_id, hour), count in views.items()}))
+
+
+def rollup_hourly_views(retention_days: int = VIEW_HOURLY_RETENTION_DAYS, batch_size: int = 500, dry_run: bool = False) -> int:
+    """Folds hourly buckets from before the retention window into daily buckets. Returns the hourly rows folded.
+
+    Pages are processed in batches, each in one transaction, so an interrupted
+    run never counts a view twice and the next run picks up where it stopped.
+    """
+    cutoff = truncate(datetime.now(), "day") - timedelta(days=retention_days)
+    hourly = (PageViewBucket.period == "hour", PageViewBucket.bucket_start < cutoff)
+    folded = 0
+    last_id = ""
+    while True:
+        with engine.begin() as conn:
+            page_ids = conn.scalars(
+                select(PageViewBucket.page_id).distinct()
+                .where(*hourly, PageViewBucket.page_id > last_id)
+                .order_by(PageViewBucket.page_id)
+                .limit(batch_size)
+            ).all()
+            if not page_ids:
+                break
+            last_id = page_ids[-1]
+            rows = conn.execute(
+                select(PageViewBucket.page_id, PageViewBucket.bucket_start, PageViewBucket.views)
+                .where(*hourly, PageViewBucket.page_id.in_(page_ids))
+            ).all()
+            days: Counter = Counter()
+            for row in rows:
+                days[(row.page_id, "day", truncate(row.bucket_start, "day"))] += row.views
+            folded += len(rows)
+            if not dry_run:
+                conn.execute(*_upsert(days))
+                conn.execute(delete(PageViewBucket).where(*hourly, PageViewBucket.page_id.in_(page_ids)))
+    if folded:
+        logger.info(f"Rolled up {folded} hourly view buckets older than {cutoff:%Y-%m-%d}.")
+    return folded
+
+
+async def view_history(
+    db: AsyncSession, page_id: str, start: datetime, end: datetime, granularity: str,
+    pending: Iterable[Tuple[datetime, int]] = (),
+) -> List[Tuple[datetime, int]]:
+    """Views of a page per hour or day in [start, end), oldest first, with empty buckets filled in.
+
+    `pending` are (hour, views) pairs not yet written to the database. Daily
+    totals combine daily and hourly buckets; hourly history is only available
+    for the last VIEW_HOURLY_RETENTION_DAYS days.
+    """
+    start = truncate(start, granularity)
+    periods = ("hour", "day") if granularity == "day" else ("hour",)
+    rows = (await db.execute(
+        select(PageViewBucket.bucket_start, PageViewBucket.views)
+        .where(
+            PageViewBucket.page_id == page_id,
+            PageViewBucket.period.in_(periods),
+            PageViewBucket.bucket_start >= start,
+            PageViewBucket.bucket_start < end,
+        )
+    )).all()
+
+    step = timedelta(days=1) if granularity == "day" else timedelta(hours=1)
+    totals: Dict[datetime, int] = {}
+    moment = start
+    while moment < end:
+        totals[moment] = 0
+        moment += step
+    for bucket_start, views in [*rows, *pending]:
+        key = truncate(bucket_start, granularity)
+        if key in totals and bucket_start < end:
+            totals[key] += views
+    return list(totals.items())
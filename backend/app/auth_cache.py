@@ -0,0 +1,98 @@
+import os
+import hmac
+import time
+import hashlib
+import logging
+import secrets
+import threading
+from typing import Dict, Tuple
+
+from .cache_backend import cache_backend, call_backend
+from .session_tokens import SESSION_SECRET, SESSION_SECRET_CONFIGURED
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
+
+
+class AuthCache:
+    """Short-lived cache of credentials that already passed a bcrypt check.
+
+    Entries are keyed by an HMAC of username, password and the stored password
+    hash under a per-process secret, so plaintext passwords are never kept and
+    a changed hash never matches an old entry.
+
+    With a shared cache backend, verified credentials are also stored there
+    so other workers can skip bcrypt too. They then key entries with a secret
+    derived from SESSION_SECRET, which must be set for workers to agree;
+    without it the cache stays per-process. Lookups and stores are coroutines, since a shared backend does blocking I/O.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES, backend=cache_backend):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.shared = backend.shared and SESSION_SECRET_CONFIGURED
+        if backend.shared and not SESSION_SECRET_CONFIGURED:
+            logger.warning(
+                "CACHE_URL points to a shared cache backend but SESSION_SECRET is not set: verified credentials "
+                "are only cached per worker, since workers cannot derive the same cache keys."
+            )
+        if self.shared:
+            self._secret = hmac.new(SESSION_SECRET, b"auth-cache", hashlib.sha256).digest()
+        else:
+            self._secret = secrets.token_bytes(32)
+        self._entries: Dict[bytes, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, username: str, password: str, hashed_password: str) -> bytes:
+        message = "\0".join((username, password, hashed_password)).encode("utf-8")
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    async def is_verified(self, username: str, password: str, hashed_password: str) -> bool:
+        key = self._key(username, password, hashed_password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] >= time.monotonic():
+                    return True
+                del self._entries[key]
+        if not self.shared:
+            return False
+        # Verified by another worker: the shared entry holds its wall-clock expiry.
+        data = await call_backend(self.backend, self.backend.get, f"auth:{key.hex()}")
+        if data is None:
+            return False
+        remaining = float(data) - time.time()
+        if remaining <= 0:
+            return False
+        self._store(key, username, time.monotonic() + remaining)
+        return True
+
+    async def add(self, username: str, password: str, hashed_password: str) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        key = self._key(username, password, hashed_password)
+        self._store(key, username, time.monotonic() + self.ttl)
+        if self.shared:
+            expires = str(time.time() + self.ttl).encode("ascii")
+            await call_backend(self.backend, self.backend.set, f"auth:{key.hex()}", expires, self.ttl)
+
+    def _store(self, key: bytes, username: str, expires: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] >= now}
+                while len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (username, expires)
+
+    def invalidate_user(self, username: str) -> None:
+        # Shared entries need no removal: a new username or password hash changes their key.
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if v[0] != username}
+
+
+auth_cache = AuthCache()
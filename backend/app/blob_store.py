@@ -0,0 +1,87 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, Tuple
+
+from .storage import UPLOAD_DIR, atomic_write_bytes, temp_path_for
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Page sources are stored once under their SHA-256 (blobs/ab/abcd...), so
+# identical uploads share a single file.
+BLOBS_DIR = UPLOAD_DIR / "blobs"
+# Blobs younger than this are never collected, so an upload that has written
+# its blob but not yet committed its page row is not raced by the collector.
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+
+
+def blob_path(digest: str) -> Path:
+    return BLOBS_DIR / digest[:2] / digest
+
+
+def _reuse(path: Path) -> bool:
+    """Refreshes the mtime of an existing blob, restarting its collection grace period.
+
+    Returns False if the blob does not exist (or was collected meanwhile) and must be written.
+    """
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def put_blob(data: bytes) -> str:
+    """Stores `data` if it is not already present and returns its SHA-256 hex digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if _reuse(path):
+        return digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(path, data)
+    return digest
+
+
+def put_blob_from_file(source: Path, digest: str) -> str:
+    """Stores a file whose SHA-256 is already known, without reading it into memory."""
+    path = blob_path(digest)
+    if _reuse(path):
+        return digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path_for(path)
+    try:
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return digest
+
+
+def read_blob(digest: str) -> bytes:
+    return blob_path(digest).read_bytes()
+
+
+def collect_garbage(referenced: Iterable[str], dry_run: bool = False) -> Tuple[int, int]:
+    """Removes blobs not in `referenced`. Returns (blobs removed, bytes reclaimed)."""
+    referenced = set(referenced)
+    cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+    removed, reclaimed = 0, 0
+    if not BLOBS_DIR.exists():
+        return removed, reclaimed
+    for path in BLOBS_DIR.glob("*/*"):
+        if path.name in referenced or path.name.startswith("."):
+            continue
+        stat_result = path.stat()
+        if stat_result.st_mtime > cutoff:
+            continue
+        if not dry_run:
+            path.unlink(missing_ok=True)
+        removed += 1
+        reclaimed += stat_result.st_size
+    logger.info(f"Blob garbage collection {'would remove' if dry_run else 'removed'} {removed} blobs ({reclaimed} bytes).")
+    return removed, reclaimed
@@ -0,0 +1,48 @@
+import os
+import logging
+
+from .database import SessionLocal, Page, PageSearchDocument, User, create_db_and_tables
+from .passwords import hash_password
+from . import search
+
+logger = logging.getLogger(__name__)
+
+
+def create_default_admin() -> None:
+    """Creates the DEFAULT_ADMIN_USERNAME account if there are no users yet."""
+    db = SessionLocal()
+    try:
+        if db.query(User.id).first() is not None:
+            logger.info("Admin user already exists. Skipping default creation.")
+            return
+        logger.info("No admin user found. Creating default admin user.")
+        default_username = os.getenv("DEFAULT_ADMIN_USERNAME", "admin")
+        default_password = os.getenv("DEFAULT_ADMIN_PASSWORD", "adminpassword")
+        db.add(User(username=default_username, hashed_password=hash_password(default_password)))
+        db.commit()
+        logger.info(f"Default admin user '{default_username}' created.")
+    finally:
+        db.close()
+
+
+def populate_search_index() -> None:
+    """Indexes existing pages the first time the search index is created on a database that already has some."""
+    db = SessionLocal()
+    try:
+        needs_index = (
+            db.query(PageSearchDocument.id).first() is None
+            and db.query(Page.id).filter(Page.is_active == True).first() is not None
+        )
+    finally:
+        db.close()
+    if needs_index:
+        logger.info("Indexing existing pages for search.")
+        search.rebuild_search_index()
+
+
+def migrate() -> None:
+    """Creates or upgrades the schema, the search index and the default admin. Safe to run repeatedly."""
+    create_db_and_tables()
+    search.create_search_index()
+    populate_search_index()
+    create_default_admin()
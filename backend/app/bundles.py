@@ -0,0 +1,243 @@
+import os
+import re
+import html
+import hashlib
+import tarfile
+import zipfile
+import posixpath
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from .storage import CHUNK_SIZE, MAX_PAGE_UPLOAD_BYTES, MAX_ASSET_UPLOAD_BYTES
+
+# --- Configuration ---
+MAX_BUNDLE_UPLOAD_BYTES = int(os.getenv("MAX_BUNDLE_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Bounds on what an archive may expand to, checked against the bytes actually
+# extracted rather than the sizes the archive claims.
+MAX_BUNDLE_EXTRACTED_BYTES = int(os.getenv("MAX_BUNDLE_EXTRACTED_BYTES", str(1024 * 1024 * 1024)))
+MAX_BUNDLE_ENTRIES = int(os.getenv("MAX_BUNDLE_ENTRIES", "10000"))
+BUNDLE_WORKERS = int(os.getenv("BUNDLE_WORKERS", "4")) # Entries prepared concurrently
+
+PAGE_SUFFIXES = {".html": "html", ".htm": "html", ".md": "markdown", ".markdown": "markdown"}
+ASSETS_DIR_NAME = "assets"
+INDEX_PAGE_NAMES = ("index.html", "index.htm", "index.md", "index.markdown")
+
+# Relative links between the files of a bundle are rewritten to the URLs they were stored under.
+LINK_ATTRIBUTE = re.compile(r"""(\s(?:href|src)\s*=\s*)(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+CSS_URL = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^\s"')]+))\s*\)""", re.IGNORECASE)
+
+
+class BundleError(Exception):
+    """The archive as a whole cannot be processed."""
+
+
+@dataclass
+class BundleEntry:
+    """A regular file from an uploaded archive and what became of it."""
+    path: str
+    size: int = 0
+    kind: Optional[str] = None # "page" or "asset"; None for skipped entries
+    source_type: Optional[str] = None # "html" or "markdown" for pages
+    digest: Optional[str] = None
+    extracted_path: Optional[Path] = None
+    owner: Optional["BundleEntry"] = None # Page an asset belongs to
+    asset_name: Optional[str] = None # Name an asset is stored under, unique within its page
+    page_id: Optional[str] = None
+    error: Optional[str] = None
+    verified_type: Optional[str] = None # Content type checked against the file's magic bytes
+
+    @property
+    def directory(self) -> str:
+        return str(PurePosixPath(self.path).parent)
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.path).name
+
+    @property
+    def content_type(self) -> Optional[str]:
+        return self.verified_type or mimetypes.guess_type(self.name)[0]
+
+    def url(self, page_id: str) -> str:
+        return f"/p/{page_id}/" if self.kind == "page" else f"/p/{page_id}/assets/{quote(self.asset_name)}"
+
+    def manifest(self) -> dict:
+        if self.error:
+            status = "skipped"
+        else:
+            status = self.kind
+        item = {"path": self.path, "status": status, "size": self.size}
+        page_id = self.page_id or (self.owner.page_id if self.owner else None)
+        if page_id and not self.error:
+            item["page_id"] = page_id
+            item["url"] = self.url(page_id)
+        if self.error:
+            item["error"] = self.error
+        return item
+
+
+def _normalize_name(name: str) -> Optional[str]:
+    """Returns a safe relative path for an archive member, or None if it must be ignored."""
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("", ".")]
+    if not parts or name.startswith("/") or ".." in parts:
+        return None
+    # Hidden files and macOS resource forks (__MACOSX/, ._foo) are never content.
+    if any(part.startswith(".") for part in parts) or parts[0] == "__MACOSX":
+        return None
+    return "/".join(parts)
+
+
+def _iter_members(archive_path: Path) -> Iterator[Tuple[str, int, object]]:
+    """Yields (name, declared size, opener) for each regular file, reading the archive sequentially."""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size, lambda info=info: archive.open(info)
+    elif tarfile.is_tarfile(archive_path):
+        # Iterating the TarFile reads one header at a time, so a compressed tar is
+        # decompressed once, front to back.
+        with tarfile.open(archive_path, "r:*") as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, member.size, lambda member=member: archive.extractfile(member)
+    else:
+        raise BundleError("Unsupported archive format. Upload a .zip or .tar(.gz/.bz2/.xz) file.")
+
+
+def _extract_member(opener, dest: Path, max_bytes: int, budget: int) -> Tuple[int, str]:
+    """Copies one member to `dest` in chunks. Returns (size, SHA-256); stops at `max_bytes` or `budget`."""
+    hasher = hashlib.sha256()
+    size = 0
+    with opener() as src, open(dest, "wb") as out:
+        while chunk := src.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > budget:
+                raise BundleError(f"Bundle expands to more than {MAX_BUNDLE_EXTRACTED_BYTES} bytes.")
+            if size > max_bytes:
+                raise ValueError(f"Entry exceeds the maximum size of {max_bytes} bytes.")
+            hasher.update(chunk)
+            out.write(chunk)
+    return size, hasher.hexdigest()
+
+
+def extract_bundle(archive_path: Path, work_dir: Path) -> List[BundleEntry]:
+    """Extracts every regular file of a zip or tar archive into `work_dir`.
+
+    Members are streamed to disk one at a time, so neither the archive nor any
+    entry is held in memory. Entries that are unsafe or too large are returned
+    with an error instead of aborting the bundle.
+    """
+    entries = []
+    extracted_bytes = 0
+    for index, (name, declared_size, opener) in enumerate(_iter_members(archive_path)):
+        if index >= MAX_BUNDLE_ENTRIES:
+            raise BundleError(f"Bundle contains more than {MAX_BUNDLE_ENTRIES} files.")
+        path = _normalize_name(name)
+        if path is None:
+            entries.append(BundleEntry(path=name, size=declared_size, error="Ignored unsafe or hidden path."))
+            continue
+        entry = BundleEntry(path=path, size=declared_size)
+        entry.source_type = PAGE_SUFFIXES.get(PurePosixPath(path).suffix.lower())
+        entry.kind = "page" if entry.source_type else "asset"
+        max_bytes = MAX_PAGE_UPLOAD_BYTES if entry.kind == "page" else MAX_ASSET_UPLOAD_BYTES
+        if declared_size > max_bytes:
+            entry.error = f"Entry exceeds the maximum size of {max_bytes} bytes."
+            entries.append(entry)
+            continue
+        dest = work_dir / str(index)
+        try:
+            entry.size, entry.digest = _extract_member(opener, dest, max_bytes, MAX_BUNDLE_EXTRACTED_BYTES - extracted_bytes)
+        except (ValueError, OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+            dest.unlink(missing_ok=True)
+            entry.error = str(e) or "Could not extract entry."
+            entries.append(entry)
+            continue
+        extracted_bytes += entry.size
+        entry.extracted_path = dest
+        entries.append(entry)
+    return entries
+
+
+def assign_assets(entries: List[BundleEntry]) -> None:
+    """Attaches each asset to the nearest page at or above its directory.
+
+    An asset in `docs/`, `docs/img/` or `docs/assets/` belongs to the page file
+    in `docs/` (or its index page if there are several), else to the page of a
+    directory further up. Assets with no such page are skipped. Assets of one
+    page that share a name are stored under numbered names (`logo-2.png`).
+    """
+    pages_by_dir: Dict[str, List[BundleEntry]] = {}
+    for entry in entries:
+        if entry.kind == "page" and not entry.error:
+            pages_by_dir.setdefault(entry.directory, []).append(entry)
+
+    names_by_page: Dict[int, set] = {}
+    for entry in entries:
+        if entry.kind != "asset" or entry.error:
+            continue
+        pages = []
+        directory = PurePosixPath(entry.path).parent
+        while True:
+            pages = pages_by_dir.get(str(directory), [])
+            if pages or str(directory) == ".":
+                break
+            directory = directory.parent
+        if len(pages) > 1:
+            pages = [page for page in pages if PurePosixPath(page.name).stem.lower() == "index"] or pages
+        if len(pages) != 1:
+            entry.error = "No page in this directory or above it to attach the asset to." if not pages else \
+                "Several pages and no index page in this directory; cannot tell which one the asset belongs to."
+            continue
+        entry.owner = pages[0]
+        names = names_by_page.setdefault(id(entry.owner), set())
+        stem, suffix = posixpath.splitext(entry.name)
+        entry.asset_name, number = entry.name, 1
+        while entry.asset_name.lower() in names:
+            number += 1
+            entry.asset_name = f"{stem}-{number}{suffix}"
+        names.add(entry.asset_name.lower())
+
+
+def bundle_urls(entries: List[BundleEntry]) -> Dict[str, str]:
+    """Maps the path of every stored page and asset in the bundle to its URL."""
+    urls = {}
+    for entry in entries:
+        page_id = entry.page_id or (entry.owner.page_id if entry.owner else None)
+        if entry.kind and not entry.error and page_id:
+            urls[entry.path] = entry.url(page_id)
+    return urls
+
+
+def _link_target(link: str, base_dir: str, urls: Dict[str, str]) -> Optional[str]:
+    """The URL a relative link from a file in `base_dir` points to, or None to leave it as it is."""
+    parts = urlsplit(link)
+    if parts.scheme or parts.netloc or not parts.path or parts.path.startswith("/"):
+        return None
+    path = posixpath.normpath(posixpath.join(base_dir, unquote(parts.path)))
+    url = urls.get(path)
+    if url is None:
+        # A link to a directory opens its index page.
+        url = next((urls[key] for key in (posixpath.join(path, name) for name in INDEX_PAGE_NAMES) if key in urls), None)
+    if url is None:
+        return None
+    return url + (f"?{parts.query}" if parts.query else "") + (f"#{parts.fragment}" if parts.fragment else "")
+
+
+def rewrite_html_links(content: str, base_dir: str, urls: Dict[str, str]) -> str:
+    """Points relative href and src attributes at the pages and assets they name in the bundle."""
+    def replace(match):
+        target = _link_target(html.unescape(match.group(2) if match.group(2) is not None else match.group(3)), base_dir, urls)
+        return match.group(0) if target is None else f'{match.group(1)}"{html.escape(target)}"'
+    return LINK_ATTRIBUTE.sub(replace, content)
+
+
+def rewrite_css_urls(content: str, base_dir: str, urls: Dict[str, str]) -> str:
+    """Points relative url() references of a stylesheet at the assets they name in the bundle."""
+    def replace(match):
+        target = _link_target(next(group for group in match.groups() if group is not None), base_dir, urls)
+        return match.group(0) if target is None else f'url("{target}")'
+    return CSS_URL.sub(replace, content)
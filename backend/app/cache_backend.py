@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# memory:// keeps state in each worker process. sqlite:///path/to/cache.db shares it
+# between all workers on the host, keeping page cache invalidation coherent and
+# letting one worker reuse page lookups and password checks made by another.
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000")) # Memory backend only
+CACHE_SWEEP_SECONDS = 60
+
+
+class MemoryBackend:
+    """Key/value store and counters held in this process. Values may carry a TTL."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] < time.monotonic():
+                del self._values[key]
+                return None
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = (value, now + ttl if ttl is not None else None)
+            if now - self._last_sweep >= CACHE_SWEEP_SECONDS or len(self._values) > self.max_entries:
+                self._sweep(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + amount
+            return value
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        self._values = {key: entry for key, entry in self._values.items() if entry[1] is None or entry[1] >= now}
+        # Dicts keep insertion order, so the oldest entries go first.
+        while len(self._values) > self.max_entries:
+            del self._values[next(iter(self._values))]
+
+
+class SQLiteBackend:
+    """Key/value store and counters in a SQLite file shared by every worker on the host.
+
+    Each thread keeps its own connection. The file runs in WAL mode, so reads
+    never wait for writers; cached values are disposable, so commits are not
+    fsynced.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._last_sweep = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl if ttl is not None else None),
+        )
+        if now - self._last_sweep >= CACHE_SWEEP_SECONDS:
+            self._last_sweep = now
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, amount),
+            )
+            value = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def counter(self, key: str) -> int:
+        row = self._connection().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+
+async def call_backend(backend, method, *args):
+    """Calls a backend method, in the threadpool if the backend is shared (its calls block on I/O)."""
+    if backend.shared:
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+
+def create_backend(url: str):
+    if url == "memory://":
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+cache_backend = create_backend(CACHE_URL)
+if cache_backend.shared:
+    logger.info(f"Using shared cache backend at {CACHE_URL}")
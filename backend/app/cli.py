@@ -0,0 +1,202 @@
+"""Maintenance commands. Run from the backend directory: python -m app.cli <command>"""
+import sys
+import logging
+import json
+import argparse
+from pathlib import Path
+
+from sqlalchemy import text
+
+from .database import engine, SessionLocal, create_db_and_tables, Page, PageVersion, Asset
+from .blob_store import put_blob, collect_garbage
+from . import bootstrap, static_publish
+from .compaction import PAGE_DELETE_RETENTION_DAYS, compact as run_compaction
+from .analytics import VIEW_HOURLY_RETENTION_DAYS
+from . import images, search
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_blobs(args):
+    """Moves page sources still stored in pages.html_content into the blob store."""
+    migrated = 0
+    db = SessionLocal()
+    try:
+        while True:
+            pages = (
+                db.query(Page)
+                .filter(Page.html_content != None)
+                .order_by(Page.id)
+                .limit(args.batch_size)
+                .all()
+            )
+            if not pages:
+                break
+            for page in pages:
+                source = page.html_content.encode("utf-8")
+                page.source_hash = put_blob(source)
+                if page.source_type is None:
+                    # Code uploads wrote HTML sources to index.html verbatim; anything else was Markdown.
+                    html_file_path = Path(page.file_path) if page.file_path else None
+                    is_html = html_file_path is not None and html_file_path.exists() and html_file_path.read_bytes() == source
+                    page.source_type = "html" if is_html else "markdown"
+                page.html_content = None
+            db.commit()
+            migrated += len(pages)
+            logger.info(f"Migrated {migrated} page sources to the blob store.")
+    finally:
+        db.close()
+
+    if args.vacuum and engine.dialect.name == "sqlite":
+        logger.info("Running VACUUM to shrink the database file...")
+        with engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+    print(f"Migrated {migrated} page sources.")
+
+
+def gc_blobs(args):
+    """Removes blobs no longer referenced by an active page or one of its retained versions."""
+    db = SessionLocal()
+    try:
+        referenced = [
+            source_hash for (source_hash,) in
+            db.query(Page.source_hash).filter(Page.is_active == True, Page.source_hash != None)
+        ]
+        referenced += [
+            source_hash for (source_hash,) in
+            db.query(PageVersion.source_hash)
+            .join(Page, Page.id == PageVersion.page_id)
+            .filter(Page.is_active == True, PageVersion.source_hash != None)
+        ]
+    finally:
+        db.close()
+    removed, reclaimed = collect_garbage(referenced, dry_run=args.dry_run)
+    print(f"{'Would remove' if args.dry_run else 'Removed'} {removed} blobs, {reclaimed} bytes.")
+
+
+def publish_static(args):
+    """Rebuilds the static publish tree (STATIC_PUBLISH_DIR) from the active pages in the database."""
+    if static_publish.STATIC_PUBLISH_DIR is None:
+        print("STATIC_PUBLISH_DIR is not set; nothing to publish.", file=sys.stderr)
+        return 1
+    db = SessionLocal()
+    try:
+        active_page_ids = [page_id for (page_id,) in db.query(Page.id).filter(Page.is_active == True)]
+    finally:
+        db.close()
+    published, removed = static_publish.rebuild(active_page_ids)
+    print(f"Published {published} pages to {static_publish.STATIC_PUBLISH_DIR}, removed {removed} stale directories.")
+
+
+def compact(args):
+    """Purges pages soft-deleted longer than the retention window, removes orphaned files and rows, and rolls up old view history."""
+    report = run_compaction(
+        retention_days=args.retention_days, batch_size=args.batch_size, dry_run=args.dry_run,
+        view_retention_days=args.view_retention_days,
+    )
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+        return
+    prefix = "Would reclaim" if args.dry_run else "Reclaimed"
+    print(f"{prefix} {report.bytes_reclaimed} bytes.")
+    for name, value in report.as_dict().items():
+        if name != "bytes_reclaimed":
+            print(f"  {name.replace('_', ' ')}: {value}")
+    if report.pages_purged and not args.dry_run:
+        print("Run gc-blobs to remove page sources that are no longer referenced.")
+
+
+def optimize_images(args):
+    """Strips metadata from image assets and generates their resized variants, for images not processed yet."""
+    if not images.PILLOW_AVAILABLE:
+        print("Pillow is not installed; install the 'images' extra.", file=sys.stderr)
+        return 1
+    processed = failed = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(Asset).filter(Asset.id > last_id, Asset.file_type.in_(list(images.OPTIMIZABLE_TYPES)))
+            if not args.all:
+                query = query.filter(Asset.variants == None)
+            assets = query.order_by(Asset.id).limit(args.batch_size).all()
+            if not assets:
+                break
+            last_id = assets[-1].id
+            for asset in assets:
+                asset_path = Path(asset.file_path)
+                try:
+                    info = images.optimize_image(asset_path, asset.file_type, images.variants_dir_for(asset_path, asset.id))
+                except Exception as e:
+                    logger.error(f"Failed to optimize asset {asset.id} ({asset_path}): {e}")
+                    info = None
+                    failed += 1
+                images.record_image_info(asset, info)
+                if info is not None and info.etag and static_publish.STATIC_PUBLISH_DIR is not None:
+                    static_publish.publish_asset(asset.page_id, asset_path)
+                processed += 1
+            db.commit()
+            logger.info(f"Optimized {processed} image assets so far.")
+    finally:
+        db.close()
+    print(f"Processed {processed} image assets ({failed} failed).")
+
+
+def rebuild_search(args):
+    """Rebuilds the full-text search index from the sources of all active pages (also applies a new SEARCH_TOKENIZER)."""
+    indexed = search.rebuild_search_index(args.batch_size)
+    print(f"Indexed {indexed} pages for search.")
+
+
+def migrate(args):
+    """Creates or upgrades the database schema and the default admin account. Run once per deployment and after upgrades."""
+    bootstrap.migrate()
+    print("Database is up to date.")
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Static Web Hosting Service maintenance commands.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_migrate = subparsers.add_parser("migrate", help=migrate.__doc__)
+    parser_migrate.set_defaults(func=migrate)
+
+    parser_migrate_blobs = subparsers.add_parser("migrate-blobs", help=migrate_blobs.__doc__)
+    parser_migrate_blobs.add_argument("--batch-size", type=int, default=500)
+    parser_migrate_blobs.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite database afterwards.")
+    parser_migrate_blobs.set_defaults(func=migrate_blobs)
+
+    parser_gc_blobs = subparsers.add_parser("gc-blobs", help=gc_blobs.__doc__)
+    parser_gc_blobs.add_argument("--dry-run", action="store_true", help="Report what would be removed without deleting.")
+    parser_gc_blobs.set_defaults(func=gc_blobs)
+
+    parser_compact = subparsers.add_parser("compact", help=compact.__doc__)
+    parser_compact.add_argument("--retention-days", type=float, default=PAGE_DELETE_RETENTION_DAYS,
+                                help="Only purge pages deleted at least this many days ago.")
+    parser_compact.add_argument("--view-retention-days", type=int, default=VIEW_HOURLY_RETENTION_DAYS,
+                                help="Fold hourly view counts older than this many days into daily totals.")
+    parser_compact.add_argument("--batch-size", type=int, default=500)
+    parser_compact.add_argument("--dry-run", action="store_true", help="Report what would be removed without deleting.")
+    parser_compact.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    parser_compact.set_defaults(func=compact)
+
+    parser_optimize_images = subparsers.add_parser("optimize-images", help=optimize_images.__doc__)
+    parser_optimize_images.add_argument("--all", action="store_true", help="Also reprocess images that already have variants.")
+    parser_optimize_images.add_argument("--batch-size", type=int, default=100)
+    parser_optimize_images.set_defaults(func=optimize_images)
+
+    parser_rebuild_search = subparsers.add_parser("rebuild-search", help=rebuild_search.__doc__)
+    parser_rebuild_search.add_argument("--batch-size", type=int, default=500)
+    parser_rebuild_search.set_defaults(func=rebuild_search)
+
+    parser_publish_static = subparsers.add_parser("publish-static", help=publish_static.__doc__)
+    parser_publish_static.set_defaults(func=publish_static)
+
+    args = parser.parse_args(argv)
+    create_db_and_tables()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import os
+import time
+import shutil
+import logging
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import delete, func, select
+
+from .database import SessionLocal, Page, Asset, PageVersion, PageViewBucket, PageSearchDocument
+from .storage import PAGES_DIR
+from . import static_publish
+from .analytics import VIEW_HOURLY_RETENTION_DAYS, rollup_hourly_views
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PAGE_DELETE_RETENTION_DAYS = float(os.getenv("PAGE_DELETE_RETENTION_DAYS", "30"))
+# Directories younger than this may belong to an upload still in progress: staging
+# directories, and page directories moved into place before their row is committed.
+STAGING_GRACE_SECONDS = int(os.getenv("STAGING_GRACE_SECONDS", "3600"))
+
+
+@dataclass
+class CompactionReport:
+    pages_purged: int = 0
+    assets_purged: int = 0
+    versions_purged: int = 0
+    orphan_directories: int = 0
+    orphan_assets: int = 0
+    orphan_versions: int = 0
+    orphan_view_buckets: int = 0
+    view_buckets_rolled_up: int = 0
+    missing_asset_files: int = 0
+    bytes_reclaimed: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def tree_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _remove_tree(path: Path, dry_run: bool) -> int:
+    """Removes a directory and returns the bytes it held."""
+    if not path.exists():
+        return 0
+    size = tree_size(path)
+    if not dry_run:
+        shutil.rmtree(path, ignore_errors=True)
+    return size
+
+
+def purge_deleted_pages(report: CompactionReport, retention_days: float, batch_size: int, dry_run: bool) -> None:
+    """Hard-deletes pages soft-deleted more than `retention_days` ago, with their files, assets, versions and view history.
+
+    Each batch removes the files first and then commits the row deletions, so an
+    interrupted run leaves pages that the next run simply picks up again.
+    """
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    # Pages deleted before deleted_at existed fall back to their last change.
+    deleted_at = func.coalesce(Page.deleted_at, Page.updated_at, Page.created_at)
+    last_id = ""
+    while True:
+        db = SessionLocal()
+        try:
+            page_ids = db.scalars(
+                select(Page.id)
+                .where(Page.is_active == False, deleted_at < cutoff, Page.id > last_id)
+                .order_by(Page.id)
+                .limit(batch_size)
+            ).all()
+            if not page_ids:
+                return
+            last_id = page_ids[-1]
+            for page_id in page_ids:
+                report.bytes_reclaimed += _remove_tree(PAGES_DIR / page_id, dry_run)
+                if static_publish.STATIC_PUBLISH_DIR is not None and not dry_run:
+                    static_publish.unpublish_page(page_id)
+            report.assets_purged += db.scalar(select(func.count(Asset.id)).where(Asset.page_id.in_(page_ids)))
+            report.versions_purged += db.scalar(select(func.count(PageVersion.id)).where(PageVersion.page_id.in_(page_ids)))
+            report.pages_purged += len(page_ids)
+            if not dry_run:
+                db.execute(delete(Asset).where(Asset.page_id.in_(page_ids)))
+                db.execute(delete(PageVersion).where(PageVersion.page_id.in_(page_ids)))
+                db.execute(delete(PageViewBucket).where(PageViewBucket.page_id.in_(page_ids)))
+                db.execute(delete(PageSearchDocument).where(PageSearchDocument.page_id.in_(page_ids)))
+                db.execute(delete(Page).where(Page.id.in_(page_ids)))
+                db.commit()
+            logger.info(f"Purged {report.pages_purged} deleted pages so far ({report.bytes_reclaimed} bytes).")
+        finally:
+            db.close()
+
+
+def remove_orphan_directories(report: CompactionReport, batch_size: int, dry_run: bool) -> None:
+    """Removes page directories with no page row, and staging directories left behind by failed uploads.
+
+    Only directories last modified more than STAGING_GRACE_SECONDS ago are candidates.
+    """
+    if not PAGES_DIR.exists():
+        return
+    stale_before = time.time() - STAGING_GRACE_SECONDS
+    batch: List[os.DirEntry] = []
+
+    def flush(batch: List[os.DirEntry]) -> None:
+        db = SessionLocal()
+        try:
+            known = set(db.scalars(select(Page.id).where(Page.id.in_([entry.name for entry in batch]))))
+        finally:
+            db.close()
+        for entry in batch:
+            if entry.name not in known:
+                logger.info(f"Removing orphaned page directory '{entry.name}'.")
+                report.orphan_directories += 1
+                report.bytes_reclaimed += _remove_tree(Path(entry.path), dry_run)
+
+    with os.scandir(PAGES_DIR) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if entry.stat(follow_symlinks=False).st_mtime >= stale_before:
+                continue
+            if entry.name.startswith(".staging-"):
+                report.orphan_directories += 1
+                report.bytes_reclaimed += _remove_tree(Path(entry.path), dry_run)
+                continue
+            if entry.name.startswith("."):
+                continue
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+
+
+def remove_orphan_rows(report: CompactionReport, batch_size: int, dry_run: bool) -> None:
+    """Deletes asset, version and view bucket rows whose page no longer exists, and counts assets whose file is missing."""
+    db = SessionLocal()
+    try:
+        page_exists = select(Page.id).where(Page.id == Asset.page_id).exists()
+        orphan_assets = select(Asset.id).where(~page_exists)
+        report.orphan_assets += db.scalar(select(func.count()).select_from(orphan_assets.subquery()))
+        version_page_exists = select(Page.id).where(Page.id == PageVersion.page_id).exists()
+        orphan_versions = select(PageVersion.id).where(~version_page_exists)
+        report.orphan_versions += db.scalar(select(func.count()).select_from(orphan_versions.subquery()))
+        # Beacon hits for page ids that never existed end up here too.
+        bucket_page_exists = select(Page.id).where(Page.id == PageViewBucket.page_id).exists()
+        report.orphan_view_buckets += db.scalar(select(func.count()).select_from(PageViewBucket).where(~bucket_page_exists))
+        if not dry_run:
+            db.execute(delete(Asset).where(Asset.id.in_(orphan_assets)))
+            db.execute(delete(PageVersion).where(PageVersion.id.in_(orphan_versions)))
+            db.execute(delete(PageViewBucket).where(~bucket_page_exists))
+            db.commit()
+
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(Asset.id, Asset.file_path).where(Asset.id > last_id).order_by(Asset.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                if not row.file_path or not os.path.exists(row.file_path):
+                    logger.warning(f"Asset {row.id} points to a missing file: {row.file_path}")
+                    report.missing_asset_files += 1
+    finally:
+        db.close()
+
+
+def compact(
+    retention_days: float = PAGE_DELETE_RETENTION_DAYS, batch_size: int = 500, dry_run: bool = False,
+    view_retention_days: int = VIEW_HOURLY_RETENTION_DAYS,
+) -> CompactionReport:
+    report = CompactionReport()
+    purge_deleted_pages(report, retention_days, batch_size, dry_run)
+    remove_orphan_directories(report, batch_size, dry_run)
+    remove_orphan_rows(report, batch_size, dry_run)
+    report.view_buckets_rolled_up = rollup_hourly_views(view_retention_days, batch_size, dry_run)
+    return report
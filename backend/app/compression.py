@@ -0,0 +1,127 @@
+import os
+import gzip
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiofiles
+
+from .storage import CHUNK_SIZE, temp_path_for
+
+try:
+    import brotli
+except ImportError: # brotli is optional; only gzip variants are produced without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+PRECOMPRESS_ENABLED = os.getenv("PRECOMPRESS_ENABLED", "true").lower() in ("1", "true", "yes")
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "9"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "11"))
+
+# Variants live next to the original file (index.html -> index.html.gz / index.html.br),
+# which is the layout nginx's gzip_static and brotli_static expect.
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+}
+
+
+def available_encodings() -> list:
+    """Encodings variants are generated for, in order of preference."""
+    if not PRECOMPRESS_ENABLED:
+        return []
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    content_type = content_type.split(";")[0].strip().lower()
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+def _compress_stream(src, out, encoding: str) -> None:
+    if encoding == "gzip":
+        # mtime=0 keeps the output deterministic for identical content.
+        with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            while chunk := src.read(CHUNK_SIZE):
+                gz.write(chunk)
+    elif encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        while chunk := src.read(CHUNK_SIZE):
+            out.write(compressor.process(chunk))
+        out.write(compressor.finish())
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def write_compressed_variants(path: Path) -> List[str]:
+    """Writes a pre-compressed copy of `path` next to it for each available encoding.
+
+    Variants that would not be smaller than the original are skipped, and stale
+    ones removed. Returns the encodings written.
+    """
+    original_size = path.stat().st_size
+    written = []
+    for encoding in available_encodings():
+        variant_path = path.with_name(path.name + ENCODING_SUFFIXES[encoding])
+        tmp_path = temp_path_for(variant_path)
+        try:
+            with open(path, "rb") as src, open(tmp_path, "wb") as out:
+                _compress_stream(src, out, encoding)
+            if tmp_path.stat().st_size >= original_size:
+                tmp_path.unlink()
+                continue
+            os.replace(tmp_path, variant_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        written.append(encoding)
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding not in written:
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+    return written
+
+
+async def read_compressed_variants(path: Path) -> Dict[str, bytes]:
+    variants = {}
+    for encoding in available_encodings():
+        try:
+            async with aiofiles.open(path.with_name(path.name + ENCODING_SUFFIXES[encoding]), "rb") as f:
+                variants[encoding] = await f.read()
+        except FileNotFoundError:
+            continue
+    return variants
+
+
+def select_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """Picks the preferred encoding from `available` that the client accepts, or None for identity."""
+    if not accept_encoding or not available:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        if encoding not in available:
+            continue
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
@@ -0,0 +1,101 @@
+import os
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse as StarletteFileResponse
+
+# --- Configuration ---
+# "no-cache" lets browsers and the proxy keep a copy but revalidate it on every
+# view, so unchanged pages cost a 304 and views are still counted.
+DEFAULT_PAGE_CACHE_CONTROL = os.getenv("PAGE_CACHE_CONTROL", "no-cache")
+DEFAULT_ASSET_CACHE_CONTROL = os.getenv("ASSET_CACHE_CONTROL", "public, max-age=86400")
+# When set (e.g. "/_uploads/"), assets are handed off to nginx with X-Accel-Redirect
+# to this internal location instead of being streamed by the backend.
+ASSET_X_ACCEL_PREFIX = os.getenv("ASSET_X_ACCEL_PREFIX", "")
+
+
+def compute_etag(data: bytes) -> str:
+    """Returns a strong ETag for the given content."""
+    return etag_from_digest(hashlib.sha256(data).hexdigest())
+
+
+def etag_from_digest(hexdigest: str) -> str:
+    return f'"{hexdigest}"'
+
+
+def variant_etag(etag: Optional[str], encoding: Optional[str]) -> Optional[str]:
+    """Strong ETags must differ per content-coding, so compressed variants get a suffix."""
+    if not etag or not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _strip_variant_suffix(etag: str) -> str:
+    etag = etag.removeprefix("W/")
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def http_date(dt: datetime) -> str:
+    """Formats a datetime as an HTTP-date. Naive datetimes are treated as local time."""
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def validator_headers(etag: Optional[str], last_modified: Optional[datetime], cache_control: str) -> dict:
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request_headers: Headers, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Evaluates If-None-Match / If-Modified-Since (RFC 9110 section 13.2.2)."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if not etag:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison function. Every content-coding of
+        # a page is derived from the same content, so any variant's tag matches.
+        candidates = [_strip_variant_suffix(tag.strip()) for tag in if_none_match.split(",")]
+        return _strip_variant_suffix(etag) in candidates
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+        return modified <= since
+    return False
+
+
+class RangeFileResponse(StarletteFileResponse):
+    """FileResponse that labels multi-range replies as multipart/byteranges.
+
+    Starlette puts the multipart boundary in Content-Range and leaves the
+    file's own Content-Type in place, which clients cannot parse.
+    """
+
+    async def _handle_multiple_ranges(self, send, ranges, file_size, send_header_only):
+        async def send_with_multipart_type(message):
+            if message["type"] == "http.response.start":
+                content_range = self.headers.get("content-range", "")
+                if content_range.startswith("multipart/byteranges"):
+                    del self.headers["content-range"]
+                    self.headers["content-type"] = content_range
+                    message = {**message, "headers": self.raw_headers}
+            await send(message)
+        await super()._handle_multiple_ranges(send_with_multipart_type, ranges, file_size, send_header_only)
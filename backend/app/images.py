@@ -0,0 +1,299 @@
+import os
+import json
+import asyncio
+import hashlib
+import importlib.util
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Set
+
+from .storage import temp_path_for
+from .http_cache import etag_from_digest
+
+# Pillow is optional; without it image assets are served as uploaded. It is only
+# imported once an image is processed, so workers that never optimize one skip it.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+IMAGE_OPTIMIZATION_ENABLED = PILLOW_AVAILABLE and os.getenv("IMAGE_OPTIMIZATION_ENABLED", "true").lower() in ("1", "true", "yes")
+IMAGE_VARIANT_WIDTHS = sorted(int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "480,960,1920").split(",") if width.strip())
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+IMAGE_STRIP_METADATA = os.getenv("IMAGE_STRIP_METADATA", "true").lower() in ("1", "true", "yes")
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000))) # Larger images are left alone
+IMAGE_OPTIMIZE_WORKERS = int(os.getenv("IMAGE_OPTIMIZE_WORKERS", "2"))
+
+# Variants of an asset live in assets/.variants/<asset id>/, out of the way of uploaded names.
+VARIANTS_DIR_NAME = ".variants"
+
+# (offset, signature, media type), checked against the first bytes of a file
+MAGIC_NUMBERS = [
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"), # After "RIFF" and the chunk size
+    (4, b"ftypavif", "image/avif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"\x00\x00\x01\x00", "image/x-icon"),
+]
+# Formats variants are generated from, and what Pillow calls them
+OPTIMIZABLE_TYPES = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+EXIF_ORIENTATION = 0x0112
+VARIANT_FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg"), "png": ("PNG", "image/png")}
+
+
+def sniff_image_type(path: Path) -> Optional[str]:
+    """The image type indicated by a file's magic bytes, or None if it is not a recognized image."""
+    with open(path, "rb") as f:
+        header = f.read(16)
+    for offset, signature, media_type in MAGIC_NUMBERS:
+        if header[offset:offset + len(signature)] == signature:
+            if media_type == "image/webp" and not header.startswith(b"RIFF"):
+                continue
+            return media_type
+    return None
+
+
+def verified_content_type(path: Path, claimed: Optional[str]) -> Optional[str]:
+    """The content type to store for an uploaded asset.
+
+    Files whose bytes are a known image format get that type whatever the
+    client claimed; files claimed to be a raster image that are not get
+    application/octet-stream. Other claims are kept.
+    """
+    sniffed = sniff_image_type(path)
+    if sniffed:
+        return sniffed
+    claimed_type = (claimed or "").split(";")[0].strip().lower()
+    if claimed_type.startswith("image/") and claimed_type != "image/svg+xml":
+        logger.warning(f"Asset '{path.name}' was uploaded as {claimed_type} but is not a recognized image.")
+        return "application/octet-stream"
+    return claimed
+
+
+@dataclass
+class ImageInfo:
+    width: int
+    height: int
+    etag: Optional[str] = None # New ETag of the original, if it was rewritten without metadata
+    variants: List[dict] = field(default_factory=list)
+
+
+def _file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _save(image, path: Path, pil_format: str, **options) -> None:
+    tmp_path = temp_path_for(path)
+    try:
+        image.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _encoder_options(pil_format: str, icc_profile: Optional[bytes]) -> dict:
+    options = {"icc_profile": icc_profile} if icc_profile else {}
+    if pil_format == "WEBP":
+        options.update(quality=IMAGE_WEBP_QUALITY, method=4)
+    elif pil_format == "JPEG":
+        options.update(quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    elif pil_format == "PNG":
+        options.update(optimize=True)
+    return options
+
+
+# Image.info keys Pillow would otherwise write back out on save
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+
+def _strip_original(image, path: Path, media_type: str, icc_profile: Optional[bytes], orientation: int) -> Optional[str]:
+    """Rewrites the original without EXIF/XMP/comments, keeping its color profile and orientation. Returns the new ETag."""
+    from PIL import Image
+
+    pil_format = OPTIMIZABLE_TYPES[media_type]
+    if pil_format == "JPEG":
+        # Reusing the original quantization tables avoids a generation loss.
+        options = {"quality": "keep"}
+    elif pil_format == "WEBP":
+        options = {"lossless": True} if image.info.get("lossless") else {"quality": 95}
+    else:
+        options = {"optimize": True}
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    if orientation != 1:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        options["exif"] = exif.tobytes()
+    inode = os.stat(path).st_ino
+    tmp_path = temp_path_for(path)
+    try:
+        image.save(tmp_path, pil_format, **options)
+        # A re-upload under the same name replaces the file; never overwrite that with the old image.
+        if os.stat(path).st_ino != inode:
+            tmp_path.unlink()
+            return None
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return etag_from_digest(_file_digest(path))
+
+
+def optimize_image(path: Path, media_type: Optional[str], variants_dir: Path) -> Optional[ImageInfo]:
+    """Strips metadata from an image asset and writes its resized variants to `variants_dir`.
+
+    Each configured width smaller than the image gets a WebP variant and a JPEG
+    one (PNG for images with transparency). The full width gets a WebP variant
+    when that is smaller than the original. Returns None for files that are
+    not an optimizable image.
+    """
+    if not PILLOW_AVAILABLE or media_type not in OPTIMIZABLE_TYPES:
+        return None
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            logger.warning(f"Not optimizing '{path.name}': {image.width}x{image.height} exceeds IMAGE_MAX_PIXELS.")
+            return None
+        if getattr(image, "is_animated", False):
+            return ImageInfo(width=image.width, height=image.height)
+        image.load()
+        icc_profile = image.info.get("icc_profile")
+        exif = image.getexif()
+        orientation = exif.get(EXIF_ORIENTATION, 1)
+        has_metadata = any(key != EXIF_ORIENTATION for key in exif) or any(key in image.info for key in METADATA_KEYS if key != "exif")
+        # Variants carry no EXIF, so the orientation is applied to their pixels.
+        oriented = ImageOps.exif_transpose(image) if orientation != 1 else image
+        for source in (image, oriented):
+            for key in METADATA_KEYS:
+                source.info.pop(key, None)
+        if IMAGE_STRIP_METADATA and has_metadata:
+            stripped_etag = _strip_original(image, path, media_type, icc_profile, orientation)
+        else:
+            stripped_etag = None
+    image = oriented
+
+    info = ImageInfo(width=image.width, height=image.height, etag=stripped_etag)
+    original_size = path.stat().st_size
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    fallback = "png" if has_alpha else "jpeg"
+    widths = [width for width in IMAGE_VARIANT_WIDTHS if width < image.width] + [image.width]
+    variants_dir.mkdir(parents=True, exist_ok=True)
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for name in ("webp", fallback) if width < image.width else ("webp",):
+            pil_format, variant_type = VARIANT_FORMATS[name]
+            if variant_type == media_type and width == image.width:
+                continue # Same as the original
+            converted = resized
+            if pil_format == "JPEG" and resized.mode != "RGB":
+                converted = resized.convert("RGB")
+            elif pil_format == "WEBP" and resized.mode not in ("RGB", "RGBA"):
+                converted = resized.convert("RGBA" if has_alpha else "RGB")
+            variant_path = variants_dir / f"{width}w.{name}"
+            _save(converted, variant_path, pil_format, **_encoder_options(pil_format, icc_profile))
+            size = variant_path.stat().st_size
+            if width == image.width and size >= original_size:
+                variant_path.unlink() # Not worth serving instead of the original
+                continue
+            info.variants.append({
+                "width": width,
+                "height": height,
+                "media_type": variant_type,
+                "file_name": variant_path.name,
+                "size": size,
+                "etag": etag_from_digest(_file_digest(variant_path)),
+            })
+    return info
+
+
+def variants_dir_for(asset_path: Path, asset_id: int) -> Path:
+    return asset_path.parent / VARIANTS_DIR_NAME / str(asset_id)
+
+
+def record_image_info(asset, info: Optional[ImageInfo]) -> None:
+    """Stores the outcome of `optimize_image` on an Asset row. An empty list marks an image as processed."""
+    if info is not None:
+        asset.width, asset.height = info.width, info.height
+        if info.etag:
+            asset.etag = info.etag
+    asset.variants = json.dumps(info.variants if info is not None else [])
+
+
+def _accepts(accept: Optional[str], media_type: str) -> bool:
+    for part in (accept or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == media_type:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def select_variant(variants: List[dict], original_width: Optional[int], accept: Optional[str], width: Optional[int]) -> Optional[dict]:
+    """Picks the variant to serve for the client's Accept header and requested width, or None for the original.
+
+    The narrowest variant at least `width` wide is used, preferring WebP when
+    the client accepts it. Without a width, or when only the original is wide
+    enough, only a full-size WebP can replace the original.
+    """
+    if not variants or not original_width:
+        return None
+    accepts_webp = _accepts(accept, "image/webp")
+    target = min(width, original_width) if width else original_width
+    wide_enough = [
+        variant for variant in variants
+        if variant["width"] >= target and (variant["media_type"] != "image/webp" or accepts_webp)
+    ]
+    if not wide_enough:
+        return None
+    chosen_width = min(variant["width"] for variant in wide_enough)
+    return min(
+        (variant for variant in wide_enough if variant["width"] == chosen_width),
+        key=lambda variant: (variant["media_type"] != "image/webp", variant["size"]),
+    )
+
+
+class ImageOptimizer:
+    """Runs image optimization jobs in the background, at most IMAGE_OPTIMIZE_WORKERS at a time.
+
+    Jobs still pending at shutdown are dropped; `python -m app.cli optimize-images`
+    processes any image assets left without variants.
+    """
+
+    def __init__(self, workers: int = IMAGE_OPTIMIZE_WORKERS):
+        self._semaphore = asyncio.Semaphore(workers)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, job: Callable[[], Awaitable[None]]) -> None:
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Callable[[], Awaitable[None]]) -> None:
+        async with self._semaphore:
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Image optimization failed: {e}", exc_info=True)
+
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+image_optimizer = ImageOptimizer()
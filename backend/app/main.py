@@ -1,25 +1,60 @@
+import time
+IMPORT_STARTED = time.perf_counter() # Taken before the imports below, so the startup log includes them
 import os
+import hmac
+import hashlib
+import random
+import asyncio
 import shutil
-import secrets
-import string
-import markdown
 import logging
 import json
-from typing import Optional, List
+import aiofiles
+from datetime import datetime, timedelta
+from typing import Callable, Optional, List, Literal, Tuple
 from pathlib import Path
+from urllib.parse import quote
 
-from fastapi import FastAPI, File, UploadFile, Form, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPBasic, HTTPBasicCredentials, HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
-from sqlalchemy.orm import Session
-
-from passlib.context import CryptContext
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import database, schemas
-from .database import engine, SessionLocal, create_db_and_tables, Page, Asset, User
+from .database import engine, async_engine, AsyncSessionLocal, get_db, Page, PageVersion, Asset, User
+from .page_cache import page_cache, CachedPage, PageRecord
+from .view_counter import view_counter
+from .analytics import MAX_STATS_RANGE, view_history
+from .search import index_pages, remove_from_search, update_search_title, search_pages as run_search
+from .auth_cache import auth_cache
+from .markdown_renderer import markdown_renderer
+from .blob_store import put_blob, put_blob_from_file
+from .page_ids import page_id_allocator, is_valid_page_id
+from .pagination import encode_cursor, decode_cursor
+from .session_tokens import SESSION_TOKENS_ENABLED, SESSION_TOKEN_TTL, credential_fingerprint, issue_token, read_token
+from .http_cache import DEFAULT_PAGE_CACHE_CONTROL, DEFAULT_ASSET_CACHE_CONTROL, ASSET_X_ACCEL_PREFIX, RangeFileResponse, compute_etag, etag_from_digest, variant_etag, validator_headers, is_not_modified
+from .storage import (
+    PAGES_DIR, MAX_PAGE_UPLOAD_BYTES, MAX_ASSET_UPLOAD_BYTES, atomic_write_bytes, new_staging_dir, temp_path_for,
+    UploadAdmissionMiddleware, read_upload_file, save_upload_file
+)
+from .bundles import (
+    MAX_BUNDLE_UPLOAD_BYTES, BUNDLE_WORKERS, BundleEntry, BundleError, extract_bundle, assign_assets, bundle_urls,
+    rewrite_html_links, rewrite_css_urls
+)
+from .metrics import METRICS_ENABLED, CONTENT_TYPE as METRICS_CONTENT_TYPE, GaugeFunc, MetricsMiddleware, instrument_engine, record_upload, registry as metrics_registry
+from .static_publish import STATIC_PUBLISH_DIR, publish_page, publish_asset, unpublish_page
+from .passwords import hash_password, verify_password
+from .rate_limit import check_rate_limit, rate_limit
+from .images import (
+    IMAGE_OPTIMIZATION_ENABLED, OPTIMIZABLE_TYPES, VARIANTS_DIR_NAME, image_optimizer, optimize_image, record_image_info,
+    select_variant, variants_dir_for, verified_content_type
+)
+from .compression import ENCODING_SUFFIXES, available_encodings, is_compressible, read_compressed_variants, select_encoding, write_compressed_variants
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -43,6 +78,88 @@ app = FastAPI(
     version=__version__
 )
 
+# --- Security Setup (HTTP Basic Auth, optional Bearer session tokens) ---
+security = HTTPBasic(auto_error=False)
+bearer_security = HTTPBearer(auto_error=False)
+
+def unauthorized(detail: str = "Incorrect username or password") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Basic"},
+    )
+
+async def get_user(db: AsyncSession, username: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+async def authenticate(
+    request: Request,
+    db: AsyncSession,
+    credentials: Optional[HTTPBasicCredentials],
+    token: Optional[HTTPAuthorizationCredentials],
+) -> User:
+    if token is not None and SESSION_TOKENS_ENABLED:
+        claims = read_token(token.credentials)
+        user = await get_user(db, claims[0]) if claims else None
+        if not user or not hmac.compare_digest(claims[1], credential_fingerprint(user.hashed_password)):
+            logger.warning("Authentication failed: invalid or expired session token")
+            raise unauthorized("Invalid or expired session token")
+        logger.debug(f"User authenticated with session token: {user.username}")
+        return user
+
+    if credentials is None:
+        raise unauthorized("Not authenticated")
+    logger.debug(f"Attempting to authenticate user: {credentials.username}")
+    user = await get_user(db, credentials.username)
+    if not user:
+        logger.warning(f"Authentication failed for user: {credentials.username}")
+        raise unauthorized()
+    # Skip bcrypt for credentials verified within the last AUTH_CACHE_TTL seconds.
+    if not await auth_cache.is_verified(credentials.username, credentials.password, user.hashed_password):
+        # Every bcrypt run costs ~100ms of CPU, so password guesses are rate limited per client.
+        check_rate_limit("auth", request)
+        # bcrypt is CPU-bound, so keep it off the event loop.
+        if not await run_in_threadpool(verify_password, credentials.password, user.hashed_password):
+            logger.warning(f"Authentication failed for user: {credentials.username}")
+            raise unauthorized()
+        await auth_cache.add(credentials.username, credentials.password, user.hashed_password)
+    logger.info(f"User authenticated successfully: {user.username}")
+    return user
+
+async def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPBasicCredentials] = Depends(security),
+    token: Optional[HTTPAuthorizationCredentials] = Depends(bearer_security),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    # Uploads were already authenticated by UploadAdmissionMiddleware before their body was read.
+    username = getattr(request.state, "authenticated_username", None)
+    user = await get_user(db, username) if username else None
+    return user or await authenticate(request, db, credentials, token)
+
+async def authenticate_upload(request: Request) -> None:
+    """Verifies an upload's credentials before it takes an upload slot, raising a 401 if they are wrong."""
+    async with AsyncSessionLocal() as db:
+        user = await authenticate(request, db, await security(request), await bearer_security(request))
+    request.state.authenticated_username = user.username
+
+def get_current_username(user: User = Depends(get_current_user)):
+    return user.username
+
+# --- Upload Admission ---
+# Credentials, the upload rate limit and size limits are checked before the body is read.
+app.add_middleware(
+    UploadAdmissionMiddleware,
+    authenticate=authenticate_upload,
+    routes=[
+        ("POST", r"/api/upload/(html|code|markdown)", MAX_PAGE_UPLOAD_BYTES),
+        ("POST", r"/api/upload/asset/[^/]+", MAX_ASSET_UPLOAD_BYTES),
+        ("POST", r"/api/upload/bundle", MAX_BUNDLE_UPLOAD_BYTES),
+        ("PUT", r"/api/pages/[^/]+/content", MAX_PAGE_UPLOAD_BYTES),
+    ],
+)
+
 # --- CORS Middleware ---
 origins = [
     "http://localhost:5173",
@@ -54,82 +171,263 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# --- Metrics ---
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    metrics_registry.register(GaugeFunc("page_cache_entries", "Pages held in the in-memory page cache.", lambda: page_cache.stats()["entries"]))
+    metrics_registry.register(GaugeFunc("page_cache_bytes", "Bytes held in the in-memory page cache.", lambda: page_cache.stats()["bytes"]))
+    metrics_registry.register(GaugeFunc("page_cache_hits_total", "Page cache hits.", lambda: page_cache.hits, kind="counter"))
+    metrics_registry.register(GaugeFunc("page_cache_misses_total", "Page cache misses.", lambda: page_cache.misses, kind="counter"))
+    metrics_registry.register(GaugeFunc("view_counts_pending", "Page views recorded but not yet written to the database.", view_counter.pending_total))
+
+# Fraction of page views logged at INFO; the rest are logged at DEBUG.
+PAGE_VIEW_LOG_SAMPLE_RATE = float(os.getenv("PAGE_VIEW_LOG_SAMPLE_RATE", "0.01"))
+
 # --- Database Setup ---
+# The schema and default admin are created by `python -m app.cli migrate`, run once per
+# deployment. AUTO_MIGRATE=true runs it at startup instead (convenient for development).
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+
+startup_state = {"ready": False, "started_at": None}
+
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     logger.info(f"Server version: {__version__}")
-    logger.info("Application startup: Creating database and tables...")
-    create_db_and_tables()
-    db = SessionLocal()
+    if AUTO_MIGRATE:
+        from .bootstrap import migrate
+        logger.info("Application startup: Migrating database schema (AUTO_MIGRATE)...")
+        await run_in_threadpool(migrate)
     try:
-        from passlib.context import CryptContext
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-        if db.query(User).count() == 0:
-            logger.info("No admin user found. Creating default admin user.")
-            default_username = os.getenv("DEFAULT_ADMIN_USERNAME", "admin")
-            default_password = os.getenv("DEFAULT_ADMIN_PASSWORD", "adminpassword")
-            hashed_password = pwd_context.hash(default_password)
-            default_user = User(username=default_username, hashed_password=hashed_password)
-            db.add(default_user)
-            db.commit()
-            logger.info(f"Default admin user '{default_username}' created.")
-        else:
-            logger.info("Admin user already exists. Skipping default creation.")
+        async with AsyncSessionLocal() as db:
+            page_id_allocator.set_page_count(await db.scalar(select(func.count(Page.id))))
     except Exception as e:
-        logger.error(f"Error during startup user creation: {e}", exc_info=True)
-    finally:
-        db.close()
+        # The database is not migrated yet; /healthz reports it until it is.
+        logger.error(f"Could not read the page count at startup: {e}")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.on_event("startup")
+async def start_view_counter():
+    view_counter.start()
 
-# --- Security Setup (HTTP Basic Auth) ---
-security = HTTPBasic()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Registered last, so it runs after every other startup handler.
+@app.on_event("startup")
+async def report_startup_time():
+    startup_state["ready"] = True
+    startup_state["started_at"] = time.time()
+    logger.info(f"Startup completed in {(time.perf_counter() - IMPORT_STARTED) * 1000:.0f} ms (including imports).")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+@app.on_event("shutdown")
+async def flush_view_counts():
+    logger.info("Application shutdown: Flushing pending view counts...")
+    await view_counter.stop()
 
-def get_current_username(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_db)):
-    logger.debug(f"Attempting to authenticate user: {credentials.username}")
-    user = db.query(User).filter(User.username == credentials.username).first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
-        logger.warning(f"Authentication failed for user: {credentials.username}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Basic"},
-        )
-    logger.info(f"User authenticated successfully: {user.username}")
-    return user.username
+@app.on_event("shutdown")
+async def stop_image_optimizer():
+    await image_optimizer.stop()
+
+@app.on_event("shutdown")
+def stop_markdown_renderer():
+    markdown_renderer.shutdown()
+
+@app.on_event("shutdown")
+async def close_database_connections():
+    # aiosqlite runs each connection in a non-daemon thread, which would keep the process alive.
+    await async_engine.dispose()
 
 # --- File Storage Configuration ---
-CURRENT_FILE_DIR = Path(__file__).parent.resolve()
-PROJECT_ROOT = CURRENT_FILE_DIR.parent.parent.parent.resolve()
-UPLOAD_DIR = PROJECT_ROOT / "backend" / "uploads"
-PAGES_DIR = UPLOAD_DIR / "pages"
 PAGES_DIR.mkdir(parents=True, exist_ok=True)
 logger.info(f"Upload directory configured at: {PAGES_DIR}")
 
 # --- Helper Functions ---
-def generate_short_id(length=6):
-    chars = string.ascii_letters + string.digits
-    confusing_chars = "0Ol1"
-    valid_chars = "".join(c for c in chars if c not in confusing_chars)
-    return ''.join(secrets.choice(valid_chars) for _ in range(length))
-
-def get_unique_page_id(db: Session):
-    while True:
-        page_id = generate_short_id()
-        if not db.query(Page).filter(Page.id == page_id).first():
-            return page_id
+PAGE_VERSION_RETENTION = int(os.getenv("PAGE_VERSION_RETENTION", "5")) # Previous versions kept per page
+
+PAGE_ID_MAX_ATTEMPTS = 10
+
+async def insert_pages(db: AsyncSession, staged: List[Tuple[Path, dict]]) -> List[Tuple[Page, Path, Path]]:
+    """Inserts pages under fresh random IDs and moves their staged directories into place.
+
+    The primary key enforces uniqueness: a colliding ID fails the INSERT and
+    new IDs are drawn, so no existence check is needed and concurrent uploads
+    cannot race. Nothing is committed; returns (page, staging dir, page dir)
+    for each page so the caller can add related rows and call commit_pages.
+    """
+    for _ in range(PAGE_ID_MAX_ATTEMPTS):
+        db_pages = []
+        for staging_dir, fields in staged:
+            page_id = page_id_allocator.generate()
+            db_pages.append(Page(id=page_id, file_path=str(PAGES_DIR / page_id / "index.html"), **fields))
+        if len({db_page.id for db_page in db_pages}) < len(db_pages):
+            page_id_allocator.record_collision()
+            continue
+        db.add_all(db_pages)
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            page_id_allocator.record_collision()
+            continue
+        moved = []
+        try:
+            for db_page, (staging_dir, _) in zip(db_pages, staged):
+                # Fails if a directory from an older page is still on disk under this ID.
+                await run_in_threadpool(os.rename, staging_dir, PAGES_DIR / db_page.id)
+                moved.append((db_page, staging_dir, PAGES_DIR / db_page.id))
+        except OSError:
+            await db.rollback()
+            await restore_staging_dirs(moved)
+            page_id_allocator.record_collision()
+            continue
+        return moved
+    logger.error(f"Could not allocate page IDs after {PAGE_ID_MAX_ATTEMPTS} attempts.")
+    raise HTTPException(status_code=500, detail="Could not allocate a page ID.")
+
+async def restore_staging_dirs(moved: List[Tuple[Page, Path, Path]]) -> None:
+    for _, staging_dir, page_dir in moved:
+        await run_in_threadpool(os.rename, page_dir, staging_dir)
+
+async def commit_pages(db: AsyncSession, moved: List[Tuple[Page, Path, Path]]) -> None:
+    """Commits pages added by insert_pages, with their search index entries. The directories are already in place, so a committed page always has its files."""
+    try:
+        await index_pages(db, [db_page for db_page, _, _ in moved])
+        await db.commit()
+    except Exception:
+        await restore_staging_dirs(moved)
+        raise
+    for db_page, _, _ in moved:
+        page_id_allocator.record_allocation()
+        await page_cache.invalidate(db_page.id)
+        await update_static_publish(publish_page, db_page.id)
+
+async def create_page(db: AsyncSession, staging_dir: Path, **fields) -> Page:
+    """Inserts a single page and commits it (see insert_pages)."""
+    moved = await insert_pages(db, [(staging_dir, fields)])
+    await commit_pages(db, moved)
+    db_page = moved[0][0]
+    await db.refresh(db_page)
+    return db_page
+
+async def update_static_publish(func, page_id: str, *args) -> None:
+    """Applies a change to the static publish tree, if enabled.
+
+    Failures are logged rather than raised: the database stays authoritative
+    and `python -m app.cli publish-static` rebuilds the tree from it.
+    """
+    if STATIC_PUBLISH_DIR is None:
+        return
+    try:
+        await run_in_threadpool(func, page_id, *args)
+    except Exception as e:
+        logger.error(f"Failed to update the static publish tree for page '{page_id}': {e}", exc_info=True)
+
+def schedule_image_optimization(asset: Asset) -> None:
+    """Queues metadata stripping and variant generation for an image asset (see images.py)."""
+    if IMAGE_OPTIMIZATION_ENABLED and asset.file_type in OPTIMIZABLE_TYPES:
+        asset_id = asset.id
+        image_optimizer.schedule(lambda: optimize_image_asset(asset_id))
+
+async def optimize_image_asset(asset_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        asset = await db.get(Asset, asset_id)
+        if asset is None:
+            return
+        asset_path = Path(asset.file_path)
+        info = await run_in_threadpool(optimize_image, asset_path, asset.file_type, variants_dir_for(asset_path, asset.id))
+        record_image_info(asset, info)
+        await db.commit()
+    if info is not None and info.etag:
+        await update_static_publish(publish_asset, asset.page_id, asset_path)
+    logger.info(f"Optimized image asset {asset_id} ({len(info.variants) if info else 0} variants).")
+
+async def get_active_page(db: AsyncSession, page_id: str) -> Optional[Page]:
+    result = await db.execute(select(Page).where(Page.id == page_id, Page.is_active == True))
+    return result.scalars().first()
+
+def write_page_file(html_file_path: Path, content: bytes) -> str:
+    """Atomically writes a rendered page and its pre-compressed variants and returns its strong ETag."""
+    atomic_write_bytes(html_file_path, content)
+    write_compressed_variants(html_file_path)
+    return compute_etag(content)
+
+def page_file_paths(html_file_path: Path) -> List[Path]:
+    """A page file followed by the paths of its pre-compressed variants."""
+    return [html_file_path] + [html_file_path.with_name(html_file_path.name + suffix) for suffix in ENCODING_SUFFIXES.values()]
+
+def remove_files(paths: List[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+def stage_page_file(html_file_path: Path, content: bytes) -> Tuple[Path, str]:
+    """Writes a page and its pre-compressed variants to hidden temp files next to `html_file_path`.
+
+    Returns the staged path, for swap_page_file, and the page's strong ETag.
+    """
+    staged = temp_path_for(html_file_path)
+    try:
+        staged.write_bytes(content)
+        write_compressed_variants(staged)
+    except BaseException:
+        remove_files(page_file_paths(staged))
+        raise
+    return staged, compute_etag(content)
+
+def swap_page_file(staged: Path, html_file_path: Path) -> List[Tuple[Path, Optional[Path]]]:
+    """Moves a staged page and its variants over the current files, each by an atomic rename.
+
+    The current files are kept as hard-linked backups. Returns (file, backup)
+    pairs for restore_page_file, with no backup for a file that did not exist.
+    """
+    backups = []
+    try:
+        for new, current in zip(page_file_paths(staged), page_file_paths(html_file_path)):
+            backup = temp_path_for(current) if current.exists() else None
+            if backup:
+                os.link(current, backup)
+            backups.append((current, backup))
+            if new.exists():
+                os.replace(new, current)
+            else:
+                current.unlink(missing_ok=True)
+    except BaseException:
+        restore_page_file(backups)
+        remove_files(page_file_paths(staged))
+        raise
+    return backups
+
+def restore_page_file(backups: List[Tuple[Path, Optional[Path]]]) -> None:
+    for current, backup in backups:
+        if backup:
+            os.replace(backup, current)
+        else:
+            current.unlink(missing_ok=True)
+
+def rewrite_stored_file(path: Path, rewrite: Callable[[str], str]) -> Optional[bytes]:
+    """Applies `rewrite` to a stored UTF-8 text file and rewrites it with its compressed variants.
+
+    Returns the new content, or None if the file is unchanged or not UTF-8.
+    """
+    try:
+        content = path.read_text(encoding="utf-8")
+    except UnicodeDecodeError:
+        return None
+    rewritten = rewrite(content)
+    if rewritten == content:
+        return None
+    data = rewritten.encode("utf-8")
+    atomic_write_bytes(path, data)
+    write_compressed_variants(path)
+    return data
+
+def version_etag(version: int) -> str:
+    """The entity tag of a page version, as used by If-Match on content updates."""
+    return f'"{version}"'
+
+def version_matches(if_match: str, version: int) -> bool:
+    tags = [tag.strip() for tag in if_match.split(",")]
+    return "*" in tags or version_etag(version) in tags
 
 def wrap_html_content_with_theme(content: str, title: str) -> str:
     """Wraps the provided HTML content with a themed HTML structure."""
@@ -167,16 +465,20 @@ def wrap_html_content_with_theme(content: str, title: str) -> str:
 
 # Authentication
 @app.post("/api/auth/login", summary="Admin Login")
-async def login(username: str = Depends(get_current_username)):
-    logger.info(f"User '{username}' logged in successfully.")
-    return {"message": f"Welcome, {username}! Login successful."}
+async def login(user: User = Depends(get_current_user)):
+    logger.info(f"User '{user.username}' logged in successfully.")
+    response = {"message": f"Welcome, {user.username}! Login successful."}
+    if SESSION_TOKENS_ENABLED:
+        response["token"] = issue_token(user.username, user.hashed_password)
+        response["expires_in"] = SESSION_TOKEN_TTL
+    return response
 
 # Upload HTML or Markdown File
 @app.post("/api/upload/html", summary="Upload HTML or Markdown File")
 async def upload_html_file(
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"Received file upload request: '{file.filename}' by user '{current_user}'")
@@ -185,194 +487,472 @@ async def upload_html_file(
         logger.warning(f"Invalid file type uploaded: {filename}")
         raise HTTPException(status_code=400, detail="Only .html, .md, or .markdown files are allowed.")
 
-    page_id = get_unique_page_id(db)
-    page_dir = PAGES_DIR / page_id
-    page_dir.mkdir(parents=True, exist_ok=True)
-    html_file_path = page_dir / "index.html"
+    staging_dir = new_staging_dir()
+    html_file_path = staging_dir / "index.html"
     page_title = title if title else filename
 
     try:
-        content_bytes = await file.read()
-        
         if filename.endswith(".md") or filename.endswith(".markdown"):
             logger.info(f"Converting Markdown file '{filename}' to HTML.")
-            md_content = content_bytes.decode("utf-8")
-            html_content = markdown.markdown(md_content)
+            md_bytes = await read_upload_file(file, MAX_PAGE_UPLOAD_BYTES)
+            record_upload("page", len(md_bytes))
+            md_content = md_bytes.decode("utf-8")
+            source_hash = await run_in_threadpool(put_blob, md_bytes)
+            source_type = "markdown"
+            html_content = await markdown_renderer.render(md_content)
             full_html = wrap_html_content_with_theme(html_content, page_title)
-            with open(html_file_path, "w", encoding="utf-8") as f:
-                f.write(full_html)
+            etag = await run_in_threadpool(write_page_file, html_file_path, full_html.encode("utf-8"))
         else: # HTML file
             logger.info(f"Saving HTML file '{filename}'.")
-            with open(html_file_path, "wb") as f:
-                f.write(content_bytes)
+            size, digest = await save_upload_file(file, html_file_path, MAX_PAGE_UPLOAD_BYTES)
+            record_upload("page", size)
+            source_hash = await run_in_threadpool(put_blob_from_file, html_file_path, digest)
+            source_type = "html"
+            await run_in_threadpool(write_compressed_variants, html_file_path)
+            etag = etag_from_digest(digest)
 
+    except HTTPException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
     except Exception as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
         logger.error(f"Error processing file '{filename}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error processing file.")
     finally:
         await file.close()
 
-    db_page = Page(id=page_id, title=page_title, file_path=str(html_file_path), html_content=None)
-    db.add(db_page)
-    db.commit()
-    db.refresh(db_page)
-    logger.info(f"Successfully created page '{page_id}' from file '{filename}'.")
-    return {"id": db_page.id, "title": db_page.title, "url": f"/p/{db_page.id}", "created_at": db_page.created_at}
+    try:
+        db_page = await create_page(
+            db, staging_dir, title=page_title, etag=etag, source_hash=source_hash, source_type=source_type
+        )
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    logger.info(f"Successfully created page '{db_page.id}' from file '{filename}'.")
+    return {"id": db_page.id, "title": db_page.title, "url": f"/p/{db_page.id}/", "created_at": db_page.created_at}
 
 # Upload HTML Code
 @app.post("/api/upload/code", summary="Upload HTML Code")
 async def upload_html_code(
     payload: schemas.HtmlCodeUpload,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"Received HTML code upload request by user '{current_user}'")
-    page_id = get_unique_page_id(db)
-    page_dir = PAGES_DIR / page_id
-    page_dir.mkdir(parents=True, exist_ok=True)
-    html_file_path = page_dir / "index.html"
+    staging_dir = new_staging_dir()
+    html_file_path = staging_dir / "index.html"
 
     try:
-        with open(html_file_path, "w", encoding="utf-8") as f:
-            f.write(payload.html_content)
+        html_bytes = payload.html_content.encode("utf-8")
+        record_upload("page", len(html_bytes))
+        source_hash = await run_in_threadpool(put_blob, html_bytes)
+        etag = await run_in_threadpool(write_page_file, html_file_path, html_bytes)
     except Exception as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
         logger.error(f"Failed to write HTML content for new page: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to write HTML content: {e}")
 
-    db_page = Page(id=page_id, title=payload.title if payload.title else "Untitled Page", file_path=str(html_file_path), html_content=payload.html_content)
-    db.add(db_page)
-    db.commit()
-    db.refresh(db_page)
-    logger.info(f"Successfully created page '{page_id}' from HTML code.")
-    return {"id": db_page.id, "title": db_page.title, "url": f"/p/{db_page.id}", "created_at": db_page.created_at}
+    try:
+        db_page = await create_page(
+            db, staging_dir, title=payload.title if payload.title else "Untitled Page", etag=etag,
+            source_hash=source_hash, source_type="html"
+        )
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    logger.info(f"Successfully created page '{db_page.id}' from HTML code.")
+    return {"id": db_page.id, "title": db_page.title, "url": f"/p/{db_page.id}/", "created_at": db_page.created_at}
 
 # Upload Markdown Code
 @app.post("/api/upload/markdown", summary="Upload Markdown Code")
 async def upload_markdown_code(
     payload: schemas.MarkdownCodeUpload,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"Received Markdown code upload request by user '{current_user}'")
-    page_id = get_unique_page_id(db)
-    page_dir = PAGES_DIR / page_id
-    page_dir.mkdir(parents=True, exist_ok=True)
-    html_file_path = page_dir / "index.html"
     page_title = payload.title if payload.title else "Untitled Page"
 
-    html_content = markdown.markdown(payload.markdown_content)
+    record_upload("page", len(payload.markdown_content.encode("utf-8")))
+    html_content = await markdown_renderer.render(payload.markdown_content)
     full_html = wrap_html_content_with_theme(html_content, page_title)
 
+    # Created only once rendering has succeeded, so a failed render leaves nothing behind.
+    staging_dir = new_staging_dir()
+    html_file_path = staging_dir / "index.html"
     try:
-        with open(html_file_path, "w", encoding="utf-8") as f:
-            f.write(full_html)
+        source_hash = await run_in_threadpool(put_blob, payload.markdown_content.encode("utf-8"))
+        etag = await run_in_threadpool(write_page_file, html_file_path, full_html.encode("utf-8"))
     except Exception as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
         logger.error(f"Failed to write converted HTML content for new page: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to write HTML content: {e}")
 
-    db_page = Page(id=page_id, title=page_title, file_path=str(html_file_path), html_content=payload.markdown_content)
-    db.add(db_page)
-    db.commit()
-    db.refresh(db_page)
-    logger.info(f"Successfully created page '{page_id}' from Markdown code.")
-    return {"id": db_page.id, "title": db_page.title, "url": f"/p/{db_page.id}", "created_at": db_page.created_at}
+    try:
+        db_page = await create_page(
+            db, staging_dir, title=page_title, etag=etag, source_hash=source_hash, source_type="markdown"
+        )
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    logger.info(f"Successfully created page '{db_page.id}' from Markdown code.")
+    return {"id": db_page.id, "title": db_page.title, "url": f"/p/{db_page.id}/", "created_at": db_page.created_at}
 
 # Upload Asset
 @app.post("/api/upload/asset/{page_id}", summary="Upload Asset for a Page")
 async def upload_asset(
     page_id: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"User '{current_user}' uploading asset '{file.filename}' for page '{page_id}'")
-    page = db.query(Page).filter(Page.id == page_id, Page.is_active == True).first()
+    page = await get_active_page(db, page_id)
     if not page:
         logger.warning(f"Page not found: {page_id}")
         raise HTTPException(status_code=404, detail="Page not found.")
 
     asset_dir = PAGES_DIR / page_id / "assets"
     asset_dir.mkdir(parents=True, exist_ok=True)
-    asset_file_path = asset_dir / file.filename
+    # Only keep the final path component so a crafted filename cannot escape the assets directory.
+    asset_name = Path(file.filename or "").name
+    if not asset_name or asset_name.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid asset filename.")
+    asset_file_path = asset_dir / asset_name
 
     try:
-        with open(asset_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        size, digest = await save_upload_file(file, asset_file_path, MAX_ASSET_UPLOAD_BYTES)
+        record_upload("asset", size)
+        # The client's Content-Type is not trusted for images; their magic bytes decide.
+        file_type = await run_in_threadpool(verified_content_type, asset_file_path, file.content_type)
+        if is_compressible(file_type):
+            await run_in_threadpool(write_compressed_variants, asset_file_path)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to save asset '{file.filename}' for page '{page_id}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to save asset.")
     finally:
-        file.file.close()
+        await file.close()
 
     db_asset = Asset(
         page_id=page_id,
-        file_name=file.filename,
-        file_type=file.content_type,
-        file_path=str(asset_file_path)
+        file_name=asset_name,
+        file_type=file_type,
+        file_path=str(asset_file_path),
+        etag=etag_from_digest(digest)
     )
     db.add(db_asset)
-    db.commit()
-    db.refresh(db_asset)
-    logger.info(f"Asset '{file.filename}' uploaded successfully for page '{page_id}'.")
-    return {"message": f"Asset '{file.filename}' uploaded successfully for page '{page_id}'."}
+    await db.commit()
+    await db.refresh(db_asset)
+    await page_cache.invalidate(page_id)
+    await update_static_publish(publish_asset, page_id, asset_file_path)
+    schedule_image_optimization(db_asset)
+    logger.info(f"Asset '{asset_name}' uploaded successfully for page '{page_id}'.")
+    return {"message": f"Asset '{asset_name}' uploaded successfully for page '{page_id}'."}
+
+# Upload Bundle
+# Every .html/.md file in the archive becomes a page and the other files become
+# assets of the nearest page at or above their directory (see assign_assets).
+# Relative links between the files are rewritten to the URLs they were stored
+# under. All rows are committed in one transaction, and the response lists what
+# happened to each entry.
+@app.post("/api/upload/bundle", summary="Upload a Zip or Tar of Pages and Assets")
+async def upload_bundle(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(get_current_username)
+):
+    logger.info(f"User '{current_user}' uploading bundle '{file.filename}'")
+    work_dir = new_staging_dir()
+    staging_dirs = []
+    try:
+        try:
+            size, _ = await save_upload_file(file, work_dir / "bundle", MAX_BUNDLE_UPLOAD_BYTES)
+            record_upload("bundle", size)
+        finally:
+            await file.close()
+        try:
+            entries = await run_in_threadpool(extract_bundle, work_dir / "bundle", work_dir)
+        except BundleError as e:
+            logger.warning(f"Rejected bundle '{file.filename}': {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+        assign_assets(entries)
+        pages = [entry for entry in entries if entry.kind == "page" and not entry.error]
+        if not pages:
+            raise HTTPException(status_code=400, detail="The bundle contains no .html or .md pages.")
+
+        page_dirs = {}
+        for entry in pages:
+            page_dirs[id(entry)] = new_staging_dir()
+            staging_dirs.append(page_dirs[id(entry)])
+        page_fields = {}
+        limiter = asyncio.Semaphore(BUNDLE_WORKERS)
+
+        async def prepare_page(entry: BundleEntry):
+            html_file_path = page_dirs[id(entry)] / "index.html"
+            if entry.source_type == "markdown":
+                md_bytes = await run_in_threadpool(entry.extracted_path.read_bytes)
+                try:
+                    md_content = md_bytes.decode("utf-8")
+                except UnicodeDecodeError:
+                    entry.error = "Markdown file is not valid UTF-8."
+                    return
+                source_hash = await run_in_threadpool(put_blob, md_bytes)
+                html_content = await markdown_renderer.render(md_content)
+                full_html = wrap_html_content_with_theme(html_content, entry.path)
+                etag = await run_in_threadpool(write_page_file, html_file_path, full_html.encode("utf-8"))
+            else:
+                await run_in_threadpool(os.replace, entry.extracted_path, html_file_path)
+                source_hash = await run_in_threadpool(put_blob_from_file, html_file_path, entry.digest)
+                await run_in_threadpool(write_compressed_variants, html_file_path)
+                etag = etag_from_digest(entry.digest)
+            page_fields[id(entry)] = dict(title=entry.path[:200], etag=etag, source_hash=source_hash, source_type=entry.source_type)
+
+        async def prepare_asset(entry: BundleEntry):
+            asset_dir = page_dirs[id(entry.owner)] / "assets"
+            await run_in_threadpool(asset_dir.mkdir, exist_ok=True)
+            await run_in_threadpool(os.replace, entry.extracted_path, asset_dir / entry.asset_name)
+            entry.verified_type = await run_in_threadpool(verified_content_type, asset_dir / entry.asset_name, entry.content_type)
+            if is_compressible(entry.content_type):
+                await run_in_threadpool(write_compressed_variants, asset_dir / entry.asset_name)
+
+        async def prepare(entry: BundleEntry):
+            async with limiter:
+                try:
+                    await (prepare_page(entry) if entry.kind == "page" else prepare_asset(entry))
+                except Exception as e:
+                    logger.error(f"Failed to process bundle entry '{entry.path}': {e}", exc_info=True)
+                    entry.error = "Failed to process entry."
+
+        # Markdown rendering and compression are independent per entry, so they run concurrently.
+        await asyncio.gather(*(prepare(entry) for entry in entries if entry.kind and not entry.error))
+        for entry in entries:
+            if entry.kind == "asset" and entry.owner is not None and entry.owner.error and not entry.error:
+                entry.error = "The page this asset belongs to was skipped."
+        pages = [entry for entry in pages if not entry.error]
+        if not pages:
+            raise HTTPException(status_code=400, detail="None of the pages in the bundle could be processed.")
+
+        moved = await insert_pages(db, [(page_dirs[id(entry)], page_fields[id(entry)]) for entry in pages])
+        for entry, (db_page, _, _) in zip(pages, moved):
+            entry.page_id = db_page.id
+
+        # The page IDs are known now, so links between the bundle's files can point at them.
+        urls = bundle_urls(entries)
+
+        async def rewrite_page_links(entry: BundleEntry, db_page: Page):
+            rewrite = lambda content: rewrite_html_links(content, entry.directory, urls)
+            data = await run_in_threadpool(rewrite_stored_file, Path(db_page.file_path), rewrite)
+            if data is not None:
+                db_page.etag = compute_etag(data)
+                if entry.source_type == "html":
+                    db_page.source_hash = await run_in_threadpool(put_blob, data)
+
+        async def rewrite_stylesheet_links(entry: BundleEntry):
+            rewrite = lambda content: rewrite_css_urls(content, entry.directory, urls)
+            asset_path = PAGES_DIR / entry.owner.page_id / "assets" / entry.asset_name
+            data = await run_in_threadpool(rewrite_stored_file, asset_path, rewrite)
+            if data is not None:
+                entry.digest = hashlib.sha256(data).hexdigest()
+
+        async def rewrite_links(entry: BundleEntry, db_page: Optional[Page] = None):
+            async with limiter:
+                try:
+                    await (rewrite_page_links(entry, db_page) if db_page is not None else rewrite_stylesheet_links(entry))
+                except Exception as e:
+                    # The entry is still usable as uploaded; only its relative links stay unresolved.
+                    logger.warning(f"Could not rewrite the links of bundle entry '{entry.path}': {e}")
+
+        await asyncio.gather(
+            *(rewrite_links(entry, db_page) for entry, (db_page, _, _) in zip(pages, moved)),
+            *(rewrite_links(entry) for entry in entries if entry.kind == "asset" and not entry.error and entry.content_type == "text/css")
+        )
+        bundle_assets = [
+            Asset(
+                page_id=entry.owner.page_id,
+                file_name=entry.asset_name,
+                file_type=entry.content_type,
+                file_path=str(PAGES_DIR / entry.owner.page_id / "assets" / entry.asset_name),
+                etag=etag_from_digest(entry.digest)
+            )
+            for entry in entries if entry.kind == "asset" and not entry.error
+        ]
+        db.add_all(bundle_assets)
+        await commit_pages(db, moved)
+        for db_asset in bundle_assets:
+            schedule_image_optimization(db_asset)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing bundle '{file.filename}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error processing bundle.")
+    finally:
+        # Removing an extracted archive can take a while, so keep it off the event loop.
+        for leftover_dir in [work_dir, *staging_dirs]:
+            await run_in_threadpool(shutil.rmtree, leftover_dir, ignore_errors=True)
+
+    manifest = [entry.manifest() for entry in entries]
+    counts = {status: sum(1 for item in manifest if item["status"] == status) for status in ("page", "asset", "skipped")}
+    logger.info(f"Bundle '{file.filename}' created {counts['page']} pages and {counts['asset']} assets, skipped {counts['skipped']} entries.")
+    return {"pages": counts["page"], "assets": counts["asset"], "skipped": counts["skipped"], "entries": manifest}
 
 # Get All Pages
 @app.get("/api/pages", response_model=List[schemas.PageResponse], summary="Get All Pages")
 async def get_all_pages(
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous response"),
+    sort: Literal["created_at", "view_count"] = "created_at",
+    order: Literal["desc", "asc"] = "desc",
+    q: Optional[str] = Query(None, max_length=200, description="Case-insensitive title search"),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
-    logger.info(f"User '{current_user}' fetching all pages.")
-    pages = db.query(Page).filter(Page.is_active == True).all()
-    response_pages = []
-    for page in pages:
-        response_pages.append(schemas.PageResponse(
-            id=page.id,
-            title=page.title,
-            url=f"/p/{page.id}",
-            created_at=page.created_at,
-            view_count=page.view_count,
-            is_active=page.is_active
-        ))
-    return response_pages
+    logger.info(f"User '{current_user}' fetching pages (sort={sort}, order={order}, limit={limit}).")
+    sort_column = Page.created_at if sort == "created_at" else Page.view_count
+    # Only the columns PageResponse needs; html_content is never loaded.
+    query = select(
+        Page.id, Page.title, Page.created_at, Page.view_count, Page.is_active, Page.cache_control, Page.version
+    ).where(Page.is_active == True)
+    if q:
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Page.title.ilike(f"%{escaped}%", escape="\\"))
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor, sort)
+        key = tuple_(sort_column, Page.id)
+        query = query.where(key < tuple_(sort_value, last_id) if order == "desc" else key > tuple_(sort_value, last_id))
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), Page.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Page.id.asc())
+
+    # Fetch one extra row to know whether another page follows.
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, sort), last.id)
+
+    return [
+        schemas.PageResponse(
+            id=row.id,
+            title=row.title,
+            url=f"/p/{row.id}/",
+            created_at=row.created_at,
+            view_count=row.view_count + view_counter.pending(row.id),
+            is_active=row.is_active,
+            cache_control=row.cache_control,
+            version=row.version or 1
+        )
+        for row in rows
+    ]
+
+# Search Pages (declared before /api/pages/{page_id}, which would otherwise take "search" as an ID)
+@app.get("/api/pages/search", response_model=List[schemas.PageSearchResult], summary="Search Pages")
+async def search_pages(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in page titles and content; the last may be a prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(get_current_username)
+):
+    logger.info(f"User '{current_user}' searching pages for '{q}'.")
+    try:
+        hits = await run_search(db, q, limit, offset)
+    except DBAPIError as e:
+        logger.error(f"Page search failed: {e}")
+        raise HTTPException(status_code=503, detail="Search index unavailable (run python -m app.cli migrate, or wait for rebuild-search to finish).")
+
+    return [
+        schemas.PageSearchResult(
+            id=hit["id"],
+            title=hit["title"],
+            url=f"/p/{hit['id']}/",
+            created_at=hit["created_at"],
+            view_count=hit["view_count"] + view_counter.pending(hit["id"]),
+            snippet=hit["snippet"]
+        )
+        for hit in hits
+    ]
 
 # Get Page Details
 @app.get("/api/pages/{page_id}", response_model=schemas.PageResponse, summary="Get Page Details")
 async def get_page_details(
     page_id: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"User '{current_user}' fetching details for page '{page_id}'.")
-    page = db.query(Page).filter(Page.id == page_id, Page.is_active == True).first()
+    page = await get_active_page(db, page_id)
     if not page:
         logger.warning(f"Page not found: {page_id}")
         raise HTTPException(status_code=404, detail="Page not found.")
     
+    response.headers["ETag"] = version_etag(page.version or 1)
     return schemas.PageResponse(
         id=page.id,
         title=page.title,
-        url=f"/p/{page.id}",
+        url=f"/p/{page.id}/",
         created_at=page.created_at,
-        view_count=page.view_count,
-        is_active=page.is_active
+        view_count=page.view_count + view_counter.pending(page.id),
+        is_active=page.is_active,
+        cache_control=page.cache_control,
+        version=page.version or 1
+    )
+
+# Get Page View History
+@app.get("/api/pages/{page_id}/stats", response_model=schemas.PageStats, summary="Get Page View History")
+async def get_page_stats(
+    page_id: str,
+    granularity: Literal["hour", "day"] = "day",
+    start: Optional[datetime] = Query(None, description="Defaults to 7 days (hourly) or 30 days (daily) before end"),
+    end: Optional[datetime] = Query(None, description="Exclusive; defaults to now"),
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(get_current_username)
+):
+    logger.info(f"User '{current_user}' fetching view history for page '{page_id}'.")
+    page = await get_active_page(db, page_id)
+    if not page:
+        logger.warning(f"Page not found: {page_id}")
+        raise HTTPException(status_code=404, detail="Page not found.")
+
+    end = end or datetime.now()
+    start = start or end - timedelta(days=7 if granularity == "hour" else 30)
+    # Buckets are stored in server local time, like every other timestamp.
+    start, end = (value.astimezone().replace(tzinfo=None) if value.tzinfo else value for value in (start, end))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end.")
+    if end - start > MAX_STATS_RANGE[granularity]:
+        raise HTTPException(status_code=400, detail=f"The range may span at most {MAX_STATS_RANGE[granularity].days} days at {granularity} granularity.")
+
+    buckets = await view_history(db, page_id, start, end, granularity, view_counter.pending_hours(page_id).items())
+    return schemas.PageStats(
+        page_id=page_id,
+        granularity=granularity,
+        start=buckets[0][0],
+        end=end,
+        total_views=sum(views for _, views in buckets),
+        buckets=[schemas.ViewBucket(start=bucket_start, views=views) for bucket_start, views in buckets]
     )
 
 # Delete Page (Soft Delete)
 @app.delete("/api/pages/{page_id}", summary="Delete Page (Soft Delete)")
 async def delete_page(
     page_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"User '{current_user}' deleting page '{page_id}'.")
-    page = db.query(Page).filter(Page.id == page_id, Page.is_active == True).first()
+    page = await get_active_page(db, page_id)
     if not page:
         logger.warning(f"Page not found for deletion: {page_id}")
         raise HTTPException(status_code=404, detail="Page not found.")
 
     page.is_active = False
-    db.commit()
+    page.deleted_at = datetime.now()
+    await remove_from_search(db, page_id)
+    await db.commit()
+    await page_cache.invalidate(page_id)
+    await update_static_publish(unpublish_page, page_id)
     logger.info(f"Page '{page_id}' soft-deleted successfully.")
     return {"message": f"Page '{page_id}' soft-deleted successfully."}
 
@@ -381,98 +961,383 @@ async def delete_page(
 async def update_page(
     page_id: str,
     page_update: schemas.PageUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: str = Depends(get_current_username)
 ):
     logger.info(f"User '{current_user}' updating page '{page_id}'.")
-    page = db.query(Page).filter(Page.id == page_id, Page.is_active == True).first()
+    page = await get_active_page(db, page_id)
     if not page:
         logger.warning(f"Page not found for update: {page_id}")
         raise HTTPException(status_code=404, detail="Page not found.")
 
     if page_update.title is not None:
         page.title = page_update.title
+        await update_search_title(db, page_id, page.title)
+    if page_update.cache_control is not None:
+        # An empty string resets the page to the default Cache-Control policy.
+        page.cache_control = page_update.cache_control or None
 
-    db.commit()
-    db.refresh(page)
+    await db.commit()
+    await db.refresh(page)
+    await page_cache.invalidate(page_id)
     logger.info(f"Page '{page_id}' updated successfully.")
     return schemas.PageResponse(
         id=page.id,
         title=page.title,
-        url=f"/p/{page.id}",
+        url=f"/p/{page.id}/",
+        created_at=page.created_at,
+        view_count=page.view_count + view_counter.pending(page.id),
+        is_active=page.is_active,
+        cache_control=page.cache_control,
+        version=page.version or 1
+    )
+
+# Update Page Content
+@app.put("/api/pages/{page_id}/content", response_model=schemas.PageResponse, summary="Update Page Content")
+async def update_page_content(
+    page_id: str,
+    payload: schemas.PageContentUpdate,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: str = Depends(get_current_username)
+):
+    logger.info(f"User '{current_user}' updating content of page '{page_id}'.")
+    page = await get_active_page(db, page_id)
+    if not page:
+        logger.warning(f"Page not found for content update: {page_id}")
+        raise HTTPException(status_code=404, detail="Page not found.")
+
+    previous_version = page.version or 1
+    # Clients can send the version they edited as If-Match ("3") so that newer changes are not overwritten.
+    if_match = request.headers.get("if-match")
+    if if_match and not version_matches(if_match, previous_version):
+        logger.warning(f"Content update of page '{page_id}' rejected: If-Match {if_match} != version {previous_version}")
+        raise HTTPException(status_code=412, detail=f"Page has changed; its current version is {previous_version}.")
+
+    page_title = payload.title if payload.title else page.title
+    source_bytes = payload.content.encode("utf-8")
+    record_upload("page", len(source_bytes))
+    if payload.content_type == "markdown":
+        html_content = await markdown_renderer.render(payload.content)
+        full_html = wrap_html_content_with_theme(html_content, page_title or "Untitled Page").encode("utf-8")
+    else:
+        full_html = source_bytes
+
+    # Claim the next version before index.html is replaced. A concurrent update holds the
+    # row until it commits, after which this conditional UPDATE matches nothing, so only
+    # one of them swaps the file.
+    claimed = await db.execute(
+        update(Page)
+        .where(Page.id == page.id, func.coalesce(Page.version, 1) == previous_version)
+        .values(version=previous_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        await db.rollback()
+        logger.warning(f"Content update of page '{page_id}' lost a race with another update of version {previous_version}.")
+        raise HTTPException(
+            status_code=412 if if_match else 409,
+            detail="Page was updated by another request; reload it and try again."
+        )
+
+    db.add(PageVersion(
+        page_id=page.id,
+        version=previous_version,
+        source_hash=page.source_hash,
+        source_type=page.source_type,
+        etag=page.etag,
+        created_at=page.updated_at or page.created_at
+    ))
+    await db.execute(
+        delete(PageVersion).where(
+            PageVersion.page_id == page.id,
+            PageVersion.version <= previous_version - PAGE_VERSION_RETENTION
+        )
+    )
+    html_file_path = Path(page.file_path)
+    try:
+        source_hash = await run_in_threadpool(put_blob, source_bytes)
+        staged, etag = await run_in_threadpool(stage_page_file, html_file_path, full_html)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to write new content for page '{page_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to write HTML content: {e}")
+
+    page.title = page_title
+    page.source_hash = source_hash
+    page.source_type = payload.content_type
+    page.etag = etag
+    page.updated_at = datetime.now()
+    page.version = previous_version + 1
+    # index.html and its variants are each replaced by an atomic rename, so readers see either the
+    # old or the new file. The old files are put back if the commit fails.
+    backups = []
+    try:
+        backups = await run_in_threadpool(swap_page_file, staged, html_file_path)
+        await index_pages(db, [page])
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await run_in_threadpool(restore_page_file, backups)
+        logger.error(f"Failed to update content of page '{page_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to update page content: {e}")
+    await run_in_threadpool(remove_files, [backup for _, backup in backups if backup])
+    await db.refresh(page)
+    await page_cache.invalidate(page_id)
+    await update_static_publish(publish_page, page_id)
+    logger.info(f"Page '{page_id}' content updated to version {page.version}.")
+    response.headers["ETag"] = version_etag(page.version)
+    return schemas.PageResponse(
+        id=page.id,
+        title=page.title,
+        url=f"/p/{page.id}/",
         created_at=page.created_at,
-        view_count=page.view_count,
-        is_active=page.is_active
+        view_count=page.view_count + view_counter.pending(page.id),
+        is_active=page.is_active,
+        cache_control=page.cache_control,
+        version=page.version
     )
 
 # Change Admin Password
 @app.put("/api/admin/password", summary="Change Admin Password")
 async def change_admin_password(
     password_change: schemas.PasswordChange,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user_username: str = Depends(get_current_username)
 ):
     logger.info(f"User '{current_user_username}' attempting to change password.")
-    user = db.query(User).filter(User.username == current_user_username).first()
+    user = await get_user(db, current_user_username)
     if not user:
         logger.error(f"User not found: {current_user_username}")
         raise HTTPException(status_code=404, detail="User not found.")
 
-    if not verify_password(password_change.old_password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, password_change.old_password, user.hashed_password):
         logger.warning(f"Incorrect password for user '{current_user_username}' during password change")
         raise HTTPException(status_code=400, detail="Incorrect old password.")
 
-    user.hashed_password = pwd_context.hash(password_change.new_password)
-    db.commit()
+    user.hashed_password = await run_in_threadpool(hash_password, password_change.new_password)
+    await db.commit()
+    auth_cache.invalidate_user(current_user_username)
     logger.info(f"Password for user '{current_user_username}' changed successfully.")
-    return {"message": "Password changed successfully."}
+    response = {"message": "Password changed successfully."}
+    if SESSION_TOKENS_ENABLED:
+        # Tokens are bound to the old password, so hand out a fresh one.
+        response["token"] = issue_token(user.username, user.hashed_password)
+    return response
 
 
 # Change Admin Username
 @app.put("/api/admin/username", summary="Change Admin Username")
 async def change_admin_username(
     username_change: schemas.UsernameChange,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user_username: str = Depends(get_current_username)
 ):
     logger.info(f"User '{current_user_username}' attempting to change username to '{username_change.new_username}'")
-    user = db.query(User).filter(User.username == current_user_username).first()
+    user = await get_user(db, current_user_username)
     if not user:
         logger.error(f"User not found: {current_user_username}")
         raise HTTPException(status_code=404, detail="User not found.")
 
-    if not verify_password(username_change.password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, username_change.password, user.hashed_password):
         logger.warning(f"Incorrect password for user '{current_user_username}' during username change")
         raise HTTPException(status_code=400, detail="Incorrect password.")
 
-    if db.query(User).filter(User.username == username_change.new_username).first():
+    if await get_user(db, username_change.new_username):
         logger.warning(f"Username '{username_change.new_username}' is already taken.")
         raise HTTPException(status_code=400, detail="Username is already taken.")
 
     user.username = username_change.new_username
-    db.commit()
+    await db.commit()
+    auth_cache.invalidate_user(current_user_username)
     logger.info(f"Username for user '{current_user_username}' successfully changed to '{username_change.new_username}'")
-    return {"message": "Username changed successfully."}
+    response = {"message": "Username changed successfully."}
+    if SESSION_TOKENS_ENABLED:
+        response["token"] = issue_token(user.username, user.hashed_password)
+    return response
+
+
+# Page Cache Statistics
+@app.get("/api/admin/cache", summary="Get Page Cache Statistics")
+async def get_page_cache_stats(current_user: str = Depends(get_current_username)):
+    logger.info(f"User '{current_user}' fetching page cache statistics.")
+    return page_cache.stats()
+
+# Readiness Probe
+@app.get("/healthz", summary="Readiness Check", include_in_schema=False)
+async def healthz(db: AsyncSession = Depends(get_db)):
+    if not startup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        await db.execute(select(Page.id).limit(1))
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "detail": "Database unavailable or not migrated (run python -m app.cli migrate)."}
+        )
+    return {"status": "ok", "version": __version__, "uptime_seconds": round(time.time() - startup_state["started_at"], 1)}
+
+# Prometheus Metrics (not proxied by the bundled nginx.conf, so only reachable from inside the host)
+@app.get("/metrics", summary="Prometheus Metrics", include_in_schema=False)
+async def get_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+# View Beacon: counts a view of a page served by nginx from the static publish tree.
+# nginx calls it through a `mirror` subrequest (see nginx.conf); pages can also use navigator.sendBeacon.
+@app.api_route("/api/beacon/p/{page_id:path}", methods=["GET", "HEAD", "POST"], status_code=204, summary="Record Page View", include_in_schema=False, dependencies=[Depends(rate_limit("serve"))])
+async def record_page_view(page_id: str):
+    page_id = page_id.rstrip("/") # nginx forwards /p/{id}/ as requested
+    if not is_valid_page_id(page_id):
+        raise HTTPException(status_code=404, detail="Page not found.")
+    # No database lookup here: views of IDs without a page are dropped when flushed.
+    view_counter.record(page_id)
+    return Response(status_code=204)
+
+
+# Redirect to the Page URL with a Trailing Slash
+# Pages are served under /p/{page_id}/ so that their relative asset URLs resolve to /p/{page_id}/assets/.
+@app.get("/p/{page_id}", include_in_schema=False)
+async def redirect_to_page(page_id: str, request: Request):
+    query = request.url.query
+    return RedirectResponse(f"/p/{page_id}/" + (f"?{query}" if query else ""), status_code=301)
 
 
 # Serve Page and Increment View Count
-@app.get("/p/{page_id}", summary="Serve Page and Increment View Count", response_class=HTMLResponse)
-async def serve_page(page_id: str, db: Session = Depends(get_db)):
+@app.get("/p/{page_id}/", summary="Serve Page and Increment View Count", response_class=HTMLResponse, dependencies=[Depends(rate_limit("serve"))])
+async def serve_page(page_id: str, request: Request, db: AsyncSession = Depends(get_db)):
     logger.debug(f"Request received for page: {page_id}")
-    page = db.query(Page).filter(Page.id == page_id, Page.is_active == True).first()
-    if not page:
-        logger.warning(f"Page not found or inactive: {page_id}")
-        raise HTTPException(status_code=404, detail="Page not found or is inactive.")
+    generation = await page_cache.generation(page_id)
+    cached = page_cache.get(page_id, generation)
+    if cached is None:
+        record = await page_cache.get_record(page_id, generation)
+        if record is None:
+            page = await get_active_page(db, page_id)
+            if not page:
+                logger.warning(f"Page not found or inactive: {page_id}")
+                raise HTTPException(status_code=404, detail="Page not found or is inactive.")
+            record = PageRecord(
+                id=page.id,
+                title=page.title,
+                file_path=page.file_path,
+                etag=page.etag,
+                last_modified=page.updated_at or page.created_at,
+                cache_control=page.cache_control or DEFAULT_PAGE_CACHE_CONTROL,
+            )
 
-    page.view_count += 1
-    db.commit()
-    logger.info(f"Serving page '{page_id}'. New view count: {page.view_count}")
+        if record.etag and is_not_modified(request.headers, record.etag, record.last_modified):
+            view_counter.record(page_id)
+            encoding = select_encoding(request.headers.get("accept-encoding"), available_encodings())
+            headers = validator_headers(variant_etag(record.etag, encoding), record.last_modified, record.cache_control)
+            headers["Vary"] = "Accept-Encoding"
+            return Response(status_code=304, headers=headers)
 
-    html_file_path = Path(page.file_path)
-    if not html_file_path.exists():
-        logger.error(f"File not found for page '{page_id}' at path: {html_file_path}")
-        raise HTTPException(status_code=404, detail="HTML content not found for this page.")
+        html_file_path = Path(record.file_path)
+        try:
+            async with aiofiles.open(html_file_path, "rb") as f:
+                content = await f.read()
+        except FileNotFoundError:
+            logger.error(f"File not found for page '{page_id}' at path: {html_file_path}")
+            raise HTTPException(status_code=404, detail="HTML content not found for this page.")
+        variants = await read_compressed_variants(html_file_path)
+
+        if not record.etag:
+            # Pages uploaded before ETags were stored get one on first view.
+            record.etag = compute_etag(content)
+            await db.execute(update(Page).where(Page.id == page_id).values(etag=record.etag))
+            await db.commit()
+        await page_cache.put_record(record, generation)
+
+        cached = CachedPage(
+            id=record.id,
+            title=record.title,
+            file_path=record.file_path,
+            content=content,
+            etag=record.etag,
+            last_modified=record.last_modified,
+            cache_control=record.cache_control,
+            variants=variants,
+            generation=generation,
+        )
+        page_cache.put(cached)
+
+    view_counter.record(page_id)
+    if PAGE_VIEW_LOG_SAMPLE_RATE > 0 and random.random() < PAGE_VIEW_LOG_SAMPLE_RATE:
+        logger.info(f"Serving page '{page_id}' (sampled).")
+    else:
+        logger.debug(f"Serving page '{page_id}'.")
+    encoding = select_encoding(request.headers.get("accept-encoding"), cached.variants)
+    headers = validator_headers(variant_etag(cached.etag, encoding), cached.last_modified, cached.cache_control)
+    headers["Vary"] = "Accept-Encoding"
+    if is_not_modified(request.headers, cached.etag, cached.last_modified):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return HTMLResponse(cached.variants[encoding], headers=headers)
+    return HTMLResponse(cached.content, headers=headers)
+
+
+# Serve Page Asset
+@app.api_route("/p/{page_id}/assets/{asset_name}", methods=["GET", "HEAD"], summary="Serve Page Asset", dependencies=[Depends(rate_limit("serve"))])
+async def serve_asset(
+    page_id: str,
+    asset_name: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=10000, description="Width the image will be displayed at, in pixels"),
+    db: AsyncSession = Depends(get_db)
+):
+    logger.debug(f"Request received for asset '{asset_name}' of page: {page_id}")
+    result = await db.execute(
+        select(Asset)
+        .join(Page, Page.id == Asset.page_id)
+        .where(Asset.page_id == page_id, Asset.file_name == asset_name, Page.is_active == True)
+        .order_by(Asset.id.desc())
+        .limit(1)
+    )
+    asset = result.scalars().first()
+    if not asset:
+        logger.warning(f"Asset not found: {page_id}/{asset_name}")
+        raise HTTPException(status_code=404, detail="Asset not found.")
+
+    media_type = asset.file_type or None
+    asset_file_path = Path(asset.file_path)
+    etag = asset.etag
+    accel_path = f"{page_id}/assets/{asset.file_name}"
+    # Optimized images: serve the best resized/re-encoded copy for this client instead.
+    variants = json.loads(asset.variants) if asset.variants else []
+    variant = select_variant(variants, asset.width, request.headers.get("accept"), w)
+    if variant:
+        media_type, etag = variant["media_type"], variant["etag"]
+        asset_file_path = variants_dir_for(asset_file_path, asset.id) / variant["file_name"]
+        accel_path = f"{page_id}/assets/{VARIANTS_DIR_NAME}/{asset.id}/{variant['file_name']}"
+
+    headers = validator_headers(etag, asset.uploaded_at, DEFAULT_ASSET_CACHE_CONTROL)
+    if variants:
+        headers["Vary"] = "Accept"
+    if is_not_modified(request.headers, etag, asset.uploaded_at):
+        return Response(status_code=304, headers=headers)
+
+    if ASSET_X_ACCEL_PREFIX:
+        # nginx serves the file itself, including Range requests.
+        headers["X-Accel-Redirect"] = f"{ASSET_X_ACCEL_PREFIX.rstrip('/')}/{quote(accel_path)}"
+        return Response(headers=headers, media_type=media_type)
+
+    if is_compressible(media_type) and "range" not in request.headers:
+        headers["Vary"] = "Accept-Encoding"
+        encoding = select_encoding(request.headers.get("accept-encoding"), available_encodings())
+        variant_path = asset_file_path.with_name(asset_file_path.name + ENCODING_SUFFIXES[encoding]) if encoding else None
+        if variant_path and await run_in_threadpool(variant_path.exists):
+            headers["ETag"] = variant_etag(asset.etag, encoding)
+            headers["Content-Encoding"] = encoding
+            return RangeFileResponse(variant_path, headers=headers, media_type=media_type)
 
-    with open(html_file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    return HTMLResponse(content)
+    if not await run_in_threadpool(asset_file_path.is_file):
+        logger.error(f"File not found for asset '{asset_name}' of page '{page_id}' at path: {asset_file_path}")
+        raise HTTPException(status_code=404, detail="Asset file not found.")
+    # FileResponse uses sendfile/pathsend where the server supports it and
+    # handles single and multi-part Range requests.
+    return RangeFileResponse(asset_file_path, headers=headers, media_type=media_type)
@@ -0,0 +1,147 @@
+import os
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# "toc" is not enabled by default: its heading IDs take quadratic time on documents
+# with many identical headings, so only add it for trusted authors.
+MARKDOWN_EXTENSIONS = tuple(
+    ext.strip() for ext in os.getenv("MARKDOWN_EXTENSIONS", "tables,fenced_code").split(",") if ext.strip()
+)
+# Documents at least this large are rendered in a separate process so they
+# cannot hold the GIL while other requests are being served.
+MARKDOWN_PROCESS_THRESHOLD = int(os.getenv("MARKDOWN_PROCESS_THRESHOLD", str(256 * 1024)))
+MARKDOWN_PROCESS_WORKERS = int(os.getenv("MARKDOWN_PROCESS_WORKERS", "2"))
+# Seconds a pool render may take before its worker processes are killed (0 disables).
+MARKDOWN_RENDER_TIMEOUT = float(os.getenv("MARKDOWN_RENDER_TIMEOUT", "30"))
+MARKDOWN_MAX_CONCURRENT_RENDERS = int(os.getenv("MARKDOWN_MAX_CONCURRENT_RENDERS", "4"))
+MARKDOWN_CACHE_MAX_ENTRIES = int(os.getenv("MARKDOWN_CACHE_MAX_ENTRIES", "256"))
+MARKDOWN_CACHE_MAX_BYTES = int(os.getenv("MARKDOWN_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Converters are expensive to build (extension setup), so finished ones are
+# reset() and reused. The pool is per process, including pool workers.
+_converters: "queue.SimpleQueue" = queue.SimpleQueue()
+
+
+def _convert(text: str, extensions: Tuple[str, ...]) -> str:
+    try:
+        converter = _converters.get_nowait()
+    except queue.Empty:
+        import markdown # Deferred so processes that never render do not import it
+        converter = markdown.Markdown(extensions=list(extensions))
+    try:
+        return converter.convert(text)
+    finally:
+        converter.reset()
+        _converters.put(converter)
+
+
+class MarkdownRenderer:
+    """Renders Markdown to HTML with pooled converters and a content-hash memo.
+
+    Rendered output is cached by the SHA-256 of the source (and the configured
+    extensions), so re-uploading or re-saving an unchanged document costs a
+    hash instead of a render.
+    """
+
+    def __init__(self, extensions: Tuple[str, ...] = MARKDOWN_EXTENSIONS):
+        self.extensions = extensions
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Bounds renders in flight so a burst of uploads queues instead of contending for the GIL.
+        self._render_slots = asyncio.Semaphore(MARKDOWN_MAX_CONCURRENT_RENDERS)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        hasher = hashlib.sha256(text.encode("utf-8"))
+        hasher.update(",".join(self.extensions).encode("utf-8"))
+        return hasher.hexdigest()
+
+    async def render(self, text: str) -> str:
+        key = self._key(text)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        async with self._render_slots:
+            if len(text) >= MARKDOWN_PROCESS_THRESHOLD and MARKDOWN_PROCESS_WORKERS > 0:
+                html = await self._render_in_pool(text)
+            else:
+                html = await run_in_threadpool(_convert, text, self.extensions)
+        self._put(key, html)
+        return html
+
+    async def _render_in_pool(self, text: str) -> str:
+        executor = self._get_executor()
+        future = asyncio.get_running_loop().run_in_executor(executor, _convert, text, self.extensions)
+        try:
+            return await asyncio.wait_for(future, MARKDOWN_RENDER_TIMEOUT if MARKDOWN_RENDER_TIMEOUT > 0 else None)
+        except asyncio.TimeoutError:
+            # A running render cannot be cancelled, so replace the pool and kill its processes.
+            logger.warning(f"Markdown render exceeded {MARKDOWN_RENDER_TIMEOUT}s; restarting the render pool.")
+            self._recycle(executor)
+            raise HTTPException(status_code=422, detail="Markdown document took too long to render.")
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                logger.info(f"Starting Markdown render pool with {MARKDOWN_PROCESS_WORKERS} processes.")
+                # "spawn" avoids forking a process that already runs server threads.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=MARKDOWN_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            html = self._cache.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def _put(self, key: str, html: str) -> None:
+        size = len(html)
+        if MARKDOWN_CACHE_MAX_ENTRIES <= 0 or size > MARKDOWN_CACHE_MAX_BYTES:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = html
+            self._cache_bytes += size
+            while len(self._cache) > MARKDOWN_CACHE_MAX_ENTRIES or self._cache_bytes > MARKDOWN_CACHE_MAX_BYTES:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+
+markdown_renderer = MarkdownRenderer()
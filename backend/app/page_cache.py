@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from .cache_backend import cache_backend, call_backend
+
+# --- Configuration ---
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "1024"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PAGE_RECORD_TTL = float(os.getenv("PAGE_RECORD_TTL", "3600")) # Seconds a page lookup stays in a shared cache backend
+# Seconds a worker trusts the page generation it last read from a shared backend, so that
+# serving a cached page needs no backend query. Updates made through other workers can
+# take this long to be seen; those made through this worker are seen at once.
+PAGE_GENERATION_TTL = float(os.getenv("PAGE_GENERATION_TTL", "1"))
+
+
+@dataclass
+class PageRecord:
+    """What serving a page needs from its database row."""
+    id: str
+    title: Optional[str]
+    file_path: str
+    etag: Optional[str]
+    last_modified: Optional[datetime]
+    cache_control: str
+
+    def dumps(self) -> bytes:
+        fields = asdict(self)
+        fields["last_modified"] = self.last_modified.isoformat() if self.last_modified else None
+        return json.dumps(fields).encode("utf-8")
+
+    @classmethod
+    def loads(cls, data: bytes) -> "PageRecord":
+        fields = json.loads(data)
+        if fields["last_modified"]:
+            fields["last_modified"] = datetime.fromisoformat(fields["last_modified"])
+        return cls(**fields)
+
+
+@dataclass
+class CachedPage:
+    """Page metadata plus the rendered bytes served for /p/{page_id}."""
+    id: str
+    title: Optional[str]
+    file_path: str
+    content: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    cache_control: Optional[str] = None
+    variants: Dict[str, bytes] = field(default_factory=dict) # Pre-compressed bodies keyed by content-coding
+    generation: int = 0 # Page generation the entry was loaded at (see PageCache.generation)
+
+    @property
+    def size(self) -> int:
+        return len(self.content) + sum(len(data) for data in self.variants.values())
+
+
+class PageCache:
+    """Size-bounded LRU cache of rendered pages, keyed by page id.
+
+    Entries are evicted least-recently-used first whenever either the entry
+    count or the total number of cached bytes exceeds its limit. Pages larger
+    than the byte budget are never cached.
+
+    Each page has a generation counter in the cache backend, bumped by
+    `invalidate`. An entry loaded at an older generation is treated as a miss,
+    so with a shared backend an update made through one worker is seen by all.
+    Shared backends do blocking I/O, so the methods that query the backend are
+    coroutines that run those queries in the threadpool.
+    """
+
+    def __init__(
+        self, max_entries: int = PAGE_CACHE_MAX_ENTRIES, max_bytes: int = PAGE_CACHE_MAX_BYTES,
+        backend=cache_backend, generation_ttl: float = PAGE_GENERATION_TTL
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.generation_ttl = generation_ttl if backend.shared else 0
+        self._entries: "OrderedDict[str, CachedPage]" = OrderedDict()
+        # Generations read from a shared backend, as (generation, monotonic expiry), by page id
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def generation(self, page_id: str) -> int:
+        """Read this before loading a page, and store it in the entry built from what was loaded."""
+        if self.generation_ttl > 0:
+            with self._lock:
+                known = self._generations.get(page_id)
+            if known is not None and known[1] > time.monotonic():
+                return known[0]
+        generation = await call_backend(self.backend, self.backend.counter, f"page-generation:{page_id}")
+        self._remember_generation(page_id, generation)
+        return generation
+
+    def get(self, page_id: str, generation: int) -> Optional[CachedPage]:
+        """The cached page, if it was loaded at `generation` (see `generation`)."""
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is not None and entry.generation != generation:
+                self._remove(page_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(page_id)
+            self.hits += 1
+            return entry
+
+    async def get_record(self, page_id: str, generation: int) -> Optional[PageRecord]:
+        """A page lookup stored by another worker, when the backend is shared."""
+        if not self.backend.shared:
+            return None
+        data = await call_backend(self.backend, self.backend.get, f"page-record:{page_id}:{generation}")
+        return PageRecord.loads(data) if data else None
+
+    async def put_record(self, record: PageRecord, generation: int) -> None:
+        if self.backend.shared:
+            await call_backend(self.backend, self.backend.set, f"page-record:{record.id}:{generation}", record.dumps(), PAGE_RECORD_TTL)
+
+    def put(self, entry: CachedPage) -> None:
+        if self.max_entries <= 0 or entry.size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(entry.id)
+            self._entries[entry.id] = entry
+            self._current_bytes += entry.size
+            while len(self._entries) > self.max_entries or self._current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= evicted.size
+                self.evictions += 1
+
+    async def invalidate(self, page_id: str) -> None:
+        generation = await call_backend(self.backend, self._bump_generation, page_id)
+        self._remember_generation(page_id, generation)
+        with self._lock:
+            self._remove(page_id)
+
+    def _bump_generation(self, page_id: str) -> int:
+        generation = self.backend.incr(f"page-generation:{page_id}")
+        self.backend.delete(f"page-record:{page_id}:{generation - 1}")
+        return generation
+
+    def _remember_generation(self, page_id: str, generation: int) -> None:
+        if self.generation_ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._generations) >= self.max_entries * 4:
+                self._generations = {key: value for key, value in self._generations.items() if value[1] > now}
+            self._generations[page_id] = (generation, now + self.generation_ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "shared": self.backend.shared,
+            }
+
+    def _remove(self, page_id: str) -> None:
+        entry = self._entries.pop(page_id, None)
+        if entry is not None:
+            self._current_bytes -= entry.size
+
+
+page_cache = PageCache()
@@ -0,0 +1,58 @@
+import os
+import string
+import secrets
+import threading
+
+# --- Configuration ---
+PAGE_ID_MIN_LENGTH = int(os.getenv("PAGE_ID_MIN_LENGTH", "6"))
+# IDs grow by one character once more than this fraction of the keyspace is in use,
+# which keeps the chance of a primary-key collision (and a retry) negligible.
+PAGE_ID_MAX_OCCUPANCY = float(os.getenv("PAGE_ID_MAX_OCCUPANCY", "0.001"))
+
+CONFUSING_CHARS = "0Ol1"
+ALPHABET = "".join(c for c in string.ascii_letters + string.digits if c not in CONFUSING_CHARS)
+
+
+class PageIdAllocator:
+    """Draws random page IDs whose length tracks how full the keyspace is.
+
+    Uniqueness is not checked here: callers insert the row and draw again if
+    the primary key rejects it.
+    """
+
+    def __init__(self, min_length: int = PAGE_ID_MIN_LENGTH, max_occupancy: float = PAGE_ID_MAX_OCCUPANCY):
+        self.min_length = min_length
+        self.max_occupancy = max_occupancy
+        self.length = min_length
+        self.page_count = 0
+        self.collisions = 0
+        self._lock = threading.Lock()
+
+    def set_page_count(self, page_count: int) -> None:
+        with self._lock:
+            self.page_count = page_count
+            self._resize()
+
+    def record_allocation(self) -> None:
+        with self._lock:
+            self.page_count += 1
+            self._resize()
+
+    def record_collision(self) -> None:
+        with self._lock:
+            self.collisions += 1
+
+    def generate(self) -> str:
+        return "".join(secrets.choice(ALPHABET) for _ in range(self.length))
+
+    def _resize(self) -> None:
+        while self.page_count > self.max_occupancy * len(ALPHABET) ** self.length:
+            self.length += 1
+
+
+page_id_allocator = PageIdAllocator()
+
+
+def is_valid_page_id(page_id: str) -> bool:
+    """Whether `page_id` could name a page (current or legacy IDs are short ASCII alphanumerics)."""
+    return 0 < len(page_id) <= 10 and page_id.isascii() and page_id.isalnum()
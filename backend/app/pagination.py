@@ -0,0 +1,27 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_value: Any, page_id: str) -> str:
+    """Encodes the sort key of the last row on a page as an opaque keyset cursor."""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, page_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, str]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, page_id = json.loads(payload)
+        if sort == "created_at":
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, int):
+            raise ValueError("view_count cursor must be an integer")
+        return sort_value, str(page_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
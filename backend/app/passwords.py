@@ -0,0 +1,24 @@
+import threading
+
+# passlib (and the bcrypt backend it loads) is imported on first use, so
+# workers that only serve pages never pay for it.
+_pwd_context = None
+_lock = threading.Lock()
+
+
+def _context():
+    global _pwd_context
+    if _pwd_context is None:
+        with _lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+                _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+
+def hash_password(password: str) -> str:
+    return _context().hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _context().verify(plain_password, hashed_password)
@@ -0,0 +1,136 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Budgets are "requests per minute" with a burst allowance, per client IP.
+RATE_LIMIT_AUTH_PER_MINUTE = float(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", "10")) # Password checks (bcrypt runs)
+RATE_LIMIT_AUTH_BURST = int(os.getenv("RATE_LIMIT_AUTH_BURST", "5"))
+RATE_LIMIT_UPLOAD_PER_MINUTE = float(os.getenv("RATE_LIMIT_UPLOAD_PER_MINUTE", "60"))
+RATE_LIMIT_UPLOAD_BURST = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "20"))
+RATE_LIMIT_SERVE_PER_MINUTE = float(os.getenv("RATE_LIMIT_SERVE_PER_MINUTE", "1200"))
+RATE_LIMIT_SERVE_BURST = int(os.getenv("RATE_LIMIT_SERVE_BURST", "200"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")) # Tracked IPs per budget
+RATE_LIMIT_SWEEP_SECONDS = 60
+# X-Real-IP (set by nginx.conf) is only believed from these peers.
+TRUSTED_PROXIES = {ip.strip() for ip in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if ip.strip()}
+
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "8"))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "5")) # Seconds to wait for a free upload slot
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets, stored as (tokens, last refill time) tuples.
+
+    Buckets are kept in least recently updated order. Buckets that have
+    refilled completely carry no information and are dropped from the front
+    by a periodic sweep, and past `max_keys` the least recently updated one is
+    evicted, so memory stays bounded under a flood of distinct clients and
+    each request does constant work.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_keys: int = RATE_LIMIT_MAX_CLIENTS):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def acquire(self, key: str) -> float:
+        """Takes a token for `key`. Returns 0 if one was available, otherwise the seconds until one will be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                retry_after = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / self.rate if self.rate > 0 else float("inf")
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if now - self._last_sweep >= RATE_LIMIT_SWEEP_SECONDS:
+                self._sweep(now)
+        return retry_after
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        full_after = self.burst / self.rate if self.rate > 0 else float("inf")
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < full_after:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+limiters = {
+    "auth": TokenBucketLimiter("auth", RATE_LIMIT_AUTH_PER_MINUTE, RATE_LIMIT_AUTH_BURST),
+    "upload": TokenBucketLimiter("upload", RATE_LIMIT_UPLOAD_PER_MINUTE, RATE_LIMIT_UPLOAD_BURST),
+    "serve": TokenBucketLimiter("serve", RATE_LIMIT_SERVE_PER_MINUTE, RATE_LIMIT_SERVE_BURST),
+}
+
+upload_slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    if peer in TRUSTED_PROXIES:
+        return request.headers.get("x-real-ip", peer).strip()
+    return peer
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests. Please try again later.",
+        # A budget of 0 per minute never refills (infinite wait); tell the client to come back in an hour.
+        headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 3600))))},
+    )
+
+
+def check_rate_limit(budget: str, request: Request) -> None:
+    """Raises a 429 if the client behind `request` has used up `budget`."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    ip = client_ip(request)
+    retry_after = limiters[budget].acquire(ip)
+    if retry_after > 0:
+        logger.warning(f"Rate limit '{budget}' exceeded by {ip}.")
+        raise too_many_requests(retry_after)
+
+
+def rate_limit(budget: str):
+    """Dependency that charges one request against `budget` for the client's IP."""
+    def check(request: Request):
+        check_rate_limit(budget, request)
+    return check
+
+
+async def acquire_upload_slot() -> None:
+    """Takes one of MAX_CONCURRENT_UPLOADS slots, or raises a 429 after UPLOAD_QUEUE_TIMEOUT seconds."""
+    try:
+        await asyncio.wait_for(upload_slots.acquire(), UPLOAD_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("All upload slots are busy; rejecting upload.")
+        raise too_many_requests(UPLOAD_QUEUE_TIMEOUT)
+
+
+def release_upload_slot() -> None:
+    upload_slots.release()
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -17,12 +17,40 @@ class PageResponse(BaseModel):
     created_at: datetime
     view_count: int
     is_active: bool
+    cache_control: Optional[str] = None
+    version: int = 1
 
     class Config:
         from_attributes = True # For SQLAlchemy ORM compatibility
 
+class PageSearchResult(BaseModel):
+    id: str
+    title: Optional[str] = None
+    url: str
+    created_at: datetime
+    view_count: int
+    snippet: str # HTML-escaped excerpt with the matched words wrapped in <mark>
+
+class ViewBucket(BaseModel):
+    start: datetime
+    views: int
+
+class PageStats(BaseModel):
+    page_id: str
+    granularity: Literal["hour", "day"]
+    start: datetime
+    end: datetime
+    total_views: int # Views within the range
+    buckets: List[ViewBucket]
+
 class PageUpdate(BaseModel):
     title: Optional[str] = None
+    cache_control: Optional[str] = None
+
+class PageContentUpdate(BaseModel):
+    content: str
+    content_type: Literal["html", "markdown"] = "html"
+    title: Optional[str] = None
 
 class PasswordChange(BaseModel):
     old_password: str
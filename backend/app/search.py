@@ -0,0 +1,255 @@
+import os
+import re
+import html
+import asyncio
+import logging
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from sqlalchemy import delete, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .database import engine, IS_SQLITE, SessionLocal, Page, PageSearchDocument
+from .blob_store import read_blob
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# FTS5 tokenizer. "trigram" matches any substring of 3+ characters, which suits
+# CJK text that has no spaces between words; changing it requires `cli rebuild-search`.
+SEARCH_TOKENIZER = os.getenv("SEARCH_TOKENIZER", "unicode61 remove_diacritics 2")
+SEARCH_MAX_BODY_CHARS = int(os.getenv("SEARCH_MAX_BODY_CHARS", "100000")) # Text indexed per page
+SEARCH_TITLE_WEIGHT = 10.0 # A match in the title counts this many times more than one in the body
+SNIPPET_TOKENS = 16
+
+# Markdown links keep their text; emphasis, heading and code markers are dropped.
+MARKDOWN_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+MARKDOWN_SYNTAX = re.compile(r"[#*_`>~|]+")
+
+# Private-use characters mark matches in snippets until the text has been HTML-escaped.
+MATCH_START, MATCH_END = "\ue000", "\ue001"
+
+# SQLite: an external-content FTS5 table over page_search_documents, kept in sync by triggers.
+# The prefix indexes let the last word of a query match as a prefix without merging the
+# entries of every word it starts.
+SQLITE_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS page_search USING fts5("
+    "title, body, content='page_search_documents', content_rowid='id', tokenize='{tokenizer}', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS page_search_insert AFTER INSERT ON page_search_documents BEGIN "
+    "INSERT INTO page_search(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS page_search_delete AFTER DELETE ON page_search_documents BEGIN "
+    "INSERT INTO page_search(page_search, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS page_search_update AFTER UPDATE ON page_search_documents BEGIN "
+    "INSERT INTO page_search(page_search, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO page_search(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS page_search_insert",
+    "DROP TRIGGER IF EXISTS page_search_delete",
+    "DROP TRIGGER IF EXISTS page_search_update",
+    "DROP TABLE IF EXISTS page_search",
+]
+# FTS5 scores every match and sorts by `rank` itself; deleted pages are filtered out
+# before LIMIT/OFFSET so a page of results is never short, and snippets are only built
+# for the returned rows.
+SQLITE_SEARCH_SQL = f"""
+SELECT d.page_id AS id, p.title, p.created_at, p.view_count,
+       snippet(page_search, 1, :match_start, :match_end, '…', {SNIPPET_TOKENS}) AS snippet
+FROM page_search
+JOIN page_search_documents AS d ON d.id = page_search.rowid
+JOIN pages AS p ON p.id = d.page_id
+WHERE page_search MATCH :query AND rank MATCH 'bm25({SEARCH_TITLE_WEIGHT}, 1.0)' AND p.is_active = 1
+ORDER BY rank
+LIMIT :limit OFFSET :offset
+"""
+
+# PostgreSQL: a GIN expression index; queries must repeat the expression exactly to use it.
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(page_search_documents.title, '')), 'A') || "
+    "to_tsvector('simple', coalesce(page_search_documents.body, ''))"
+)
+PG_INDEX_DDL = [f"CREATE INDEX IF NOT EXISTS ix_page_search_documents_fts ON page_search_documents USING GIN (({PG_DOCUMENT}))"]
+PG_DROP_DDL = ["DROP INDEX IF EXISTS ix_page_search_documents_fts"]
+PG_SEARCH_SQL = f"""
+SELECT page_search_documents.page_id AS id, pages.title, pages.created_at, pages.view_count,
+       ts_headline('simple', coalesce(page_search_documents.body, ''), query,
+                   'StartSel=' || :match_start || ', StopSel=' || :match_end || ', MaxWords={SNIPPET_TOKENS}, MinWords=8') AS snippet
+FROM page_search_documents
+JOIN pages ON pages.id = page_search_documents.page_id
+CROSS JOIN websearch_to_tsquery('simple', :query) AS query
+WHERE ({PG_DOCUMENT}) @@ query AND pages.is_active
+ORDER BY ts_rank({PG_DOCUMENT}, query) DESC
+LIMIT :limit OFFSET :offset
+"""
+
+
+class _TextExtractor(HTMLParser):
+    SKIPPED_TAGS = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def extract_text(source: bytes, source_type: Optional[str]) -> str:
+    """The searchable text of a page source: its visible text, without tags, scripts or Markdown syntax."""
+    content = source.decode("utf-8", errors="replace")
+    if source_type == "markdown":
+        content = MARKDOWN_LINK.sub(r"\1", content)
+    parser = _TextExtractor() # Markdown may embed HTML too
+    parser.feed(content)
+    parser.close()
+    content = " ".join(parser.parts)
+    if source_type == "markdown":
+        content = MARKDOWN_SYNTAX.sub(" ", content)
+    return " ".join(content.split())[:SEARCH_MAX_BODY_CHARS]
+
+
+def load_page_text(source_hash: Optional[str], source_type: Optional[str], file_path: Optional[str]) -> str:
+    try:
+        if source_hash:
+            return extract_text(read_blob(source_hash), source_type)
+        if file_path:
+            # Pages from before the blob store: index the served HTML.
+            return extract_text(Path(file_path).read_bytes(), "html")
+    except OSError as e:
+        logger.warning(f"Could not read the source of a page to index it: {e}")
+    return ""
+
+
+def _upsert():
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(PageSearchDocument)
+    return stmt.on_conflict_do_update(
+        index_elements=[PageSearchDocument.page_id],
+        set_={"title": stmt.excluded.title, "body": stmt.excluded.body},
+    )
+
+
+# --- Index Maintenance ---
+def create_search_index() -> None:
+    """Creates the full-text index over page_search_documents if it does not exist."""
+    if IS_SQLITE:
+        statements = [ddl.format(tokenizer=SEARCH_TOKENIZER.replace("'", "''")) for ddl in SQLITE_INDEX_DDL]
+    else:
+        statements = PG_INDEX_DDL
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def rebuild_search_index(batch_size: int = 500) -> int:
+    """Re-creates the index (applying SEARCH_TOKENIZER) from the sources of all active pages. Returns the pages indexed.
+
+    Searches fail until it finishes; page changes made meanwhile are kept.
+    """
+    with engine.begin() as conn:
+        for statement in SQLITE_DROP_DDL if IS_SQLITE else PG_DROP_DDL:
+            conn.execute(text(statement))
+        conn.execute(delete(PageSearchDocument))
+
+    # Oldest first, so that row ids follow page age as they do for pages indexed on upload.
+    indexed = 0
+    last = None
+    while True:
+        query = (
+            select(Page.id, Page.created_at, Page.title, Page.source_hash, Page.source_type, Page.file_path)
+            .where(Page.is_active == True)
+            .order_by(Page.created_at, Page.id)
+            .limit(batch_size)
+        )
+        if last is not None:
+            query = query.where(tuple_(Page.created_at, Page.id) > tuple_(last.created_at, last.id))
+        db = SessionLocal()
+        try:
+            rows = db.execute(query).all()
+        finally:
+            db.close()
+        if not rows:
+            break
+        last = rows[-1]
+        documents = [
+            {"page_id": row.id, "title": row.title, "body": load_page_text(row.source_hash, row.source_type, row.file_path)}
+            for row in rows
+        ]
+        with engine.begin() as conn:
+            conn.execute(_upsert(), documents)
+        indexed += len(documents)
+        logger.info(f"Indexed {indexed} pages so far.")
+
+    create_search_index()
+    if IS_SQLITE:
+        # The triggers were gone while the documents were written; index them in one pass.
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO page_search(page_search) VALUES ('rebuild')"))
+            conn.execute(text("INSERT INTO page_search(page_search) VALUES ('optimize')"))
+    return indexed
+
+
+# --- Request-Time Operations ---
+# These run inside the caller's transaction, so the index changes with the page.
+async def index_pages(db: AsyncSession, pages: Sequence[Page]) -> None:
+    """Adds pages to the search index, or refreshes them, from their current title and source."""
+    if not pages:
+        return
+    bodies = await asyncio.gather(*(
+        run_in_threadpool(load_page_text, page.source_hash, page.source_type, page.file_path) for page in pages
+    ))
+    await db.execute(_upsert(), [
+        {"page_id": page.id, "title": page.title, "body": body} for page, body in zip(pages, bodies)
+    ])
+
+
+async def update_search_title(db: AsyncSession, page_id: str, title: Optional[str]) -> None:
+    await db.execute(update(PageSearchDocument).where(PageSearchDocument.page_id == page_id).values(title=title))
+
+
+async def remove_from_search(db: AsyncSession, page_id: str) -> None:
+    await db.execute(delete(PageSearchDocument).where(PageSearchDocument.page_id == page_id))
+
+
+def _fts_query(query: str) -> Optional[str]:
+    """Turns user input into an FTS5 query matching all of its words, the last one (if not a single character) as a prefix."""
+    words = [word for word in query.split() if any(char.isalnum() for char in word)]
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    if len(words[-1]) > 1:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlight(snippet: Optional[str]) -> str:
+    return html.escape(snippet or "").replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+
+async def search_pages(db: AsyncSession, query: str, limit: int, offset: int) -> List[dict]:
+    """Active pages matching `query`, best first, as dicts of id, title, created_at, view_count and snippet.
+
+    Snippets are HTML-escaped, with the matched words wrapped in <mark>.
+    """
+    params = {"query": query, "limit": limit, "offset": offset, "match_start": MATCH_START, "match_end": MATCH_END}
+    if IS_SQLITE:
+        params["query"] = _fts_query(query)
+        if params["query"] is None:
+            return []
+    rows = (await db.execute(text(SQLITE_SEARCH_SQL if IS_SQLITE else PG_SEARCH_SQL), params)).all()
+    return [dict(row._mapping, snippet=_highlight(row.snippet)) for row in rows]
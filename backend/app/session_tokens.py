@@ -0,0 +1,64 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import secrets
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+SESSION_SECRET_CONFIGURED = bool(os.getenv("SESSION_SECRET"))
+# Without a configured secret, tokens would only be valid for the lifetime of this
+# process (and a single worker), so they are off unless SESSION_SECRET is set.
+SESSION_TOKENS_ENABLED = os.getenv(
+    "SESSION_TOKENS_ENABLED", "true" if SESSION_SECRET_CONFIGURED else "false"
+).lower() in ("1", "true", "yes")
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", str(12 * 60 * 60)))
+SESSION_SECRET = os.getenv("SESSION_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+
+if SESSION_TOKENS_ENABLED and not SESSION_SECRET_CONFIGURED:
+    logger.warning(
+        "SESSION_TOKENS_ENABLED is set without SESSION_SECRET: session tokens are signed with a random "
+        "per-process secret and are rejected after a restart or by any other worker."
+    )
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode("utf-8"), hashlib.sha256).digest())
+
+
+def credential_fingerprint(hashed_password: str) -> str:
+    """Ties a token to the password it was issued for, so changing the password revokes it."""
+    return _sign(hashed_password)[:16]
+
+
+def issue_token(username: str, hashed_password: str) -> str:
+    claims = [username, int(time.time()) + SESSION_TOKEN_TTL, credential_fingerprint(hashed_password)]
+    payload = _b64encode(json.dumps(claims).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_token(token: str) -> Optional[Tuple[str, str]]:
+    """Returns (username, credential fingerprint) for a valid, unexpired token, else None."""
+    payload, _, signature = token.partition(".")
+    if not payload or not hmac.compare_digest(signature.encode("utf-8"), _sign(payload).encode("utf-8")):
+        return None
+    try:
+        username, expires_at, fingerprint = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if expires_at < time.time():
+        return None
+    return username, fingerprint
@@ -0,0 +1,156 @@
+import os
+import fcntl
+import shutil
+import logging
+import secrets
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+from .storage import PAGES_DIR, temp_path_for
+from .compression import ENCODING_SUFFIXES
+from .database import SessionLocal, Page
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# When set, active pages are mirrored to STATIC_PUBLISH_DIR/<page_id>/ so nginx can
+# serve /p/<page_id> straight from disk (see nginx.conf). Unset disables the mode.
+STATIC_PUBLISH_DIR: Optional[Path] = Path(os.environ["STATIC_PUBLISH_DIR"]).resolve() if os.getenv("STATIC_PUBLISH_DIR") else None
+
+
+@contextmanager
+def _page_lock(page_id: str) -> Iterator[None]:
+    """Holds an exclusive lock on one page's publish directory.
+
+    The lock is an flock on a file under STATIC_PUBLISH_DIR/.locks, so it
+    serializes changes across threads, workers and the CLI alike.
+    """
+    lock_dir = STATIC_PUBLISH_DIR / ".locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / page_id, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _is_active(page_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(Page.is_active).filter(Page.id == page_id).scalar() is True
+    finally:
+        db.close()
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    """Hard-links `source` to `dest`, copying when the trees are on different filesystems.
+
+    Page files are only ever replaced by rename, never rewritten in place, so a
+    hard link keeps showing the version that was published.
+    """
+    tmp_path = temp_path_for(dest)
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _mirror_tree(source_dir: Path, dest_dir: Path) -> None:
+    for source in source_dir.rglob("*"):
+        if source.name.startswith(".") or not source.is_file():
+            continue
+        dest = dest_dir / source.relative_to(source_dir)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(source, dest)
+
+
+def publish_page(page_id: str) -> None:
+    """Mirrors a page's directory (index.html, compressed variants and assets) into the publish tree.
+
+    The new tree is assembled next to the old one and swapped in with renames,
+    so nginx never sees a half-written page. A page that is no longer active
+    is unpublished instead, so a publish racing with a delete cannot bring it back.
+    """
+    with _page_lock(page_id):
+        if _is_active(page_id):
+            _publish_page(page_id)
+        else:
+            _unpublish_page(page_id)
+
+
+def _publish_page(page_id: str) -> None:
+    source_dir = PAGES_DIR / page_id
+    dest_dir = STATIC_PUBLISH_DIR / page_id
+    build_dir = STATIC_PUBLISH_DIR / f".{page_id}.{secrets.token_hex(6)}.tmp"
+    old_dir = STATIC_PUBLISH_DIR / f".{page_id}.{secrets.token_hex(6)}.old"
+    try:
+        build_dir.mkdir()
+        _mirror_tree(source_dir, build_dir)
+        if dest_dir.exists():
+            os.rename(dest_dir, old_dir)
+        os.rename(build_dir, dest_dir)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def publish_asset(page_id: str, asset_path: Path) -> None:
+    """Publishes one asset and its compressed variants of an already published page."""
+    dest_dir = STATIC_PUBLISH_DIR / page_id
+    with _page_lock(page_id):
+        if not dest_dir.is_dir():
+            if _is_active(page_id):
+                _publish_page(page_id)
+            return
+        asset_dir = dest_dir / "assets"
+        asset_dir.mkdir(exist_ok=True)
+        for suffix in ("", *ENCODING_SUFFIXES.values()):
+            source = asset_path.with_name(asset_path.name + suffix)
+            if source.exists():
+                _link_or_copy(source, asset_dir / source.name)
+            else:
+                (asset_dir / source.name).unlink(missing_ok=True)
+
+
+def unpublish_page(page_id: str) -> None:
+    with _page_lock(page_id):
+        _unpublish_page(page_id)
+
+
+def _unpublish_page(page_id: str) -> None:
+    dest_dir = STATIC_PUBLISH_DIR / page_id
+    if not dest_dir.exists():
+        return
+    old_dir = STATIC_PUBLISH_DIR / f".{page_id}.{secrets.token_hex(6)}.old"
+    os.rename(dest_dir, old_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def rebuild(active_page_ids: Iterable[str]) -> Tuple[int, int]:
+    """Makes the publish tree match the given active pages. Returns (pages published, directories removed)."""
+    STATIC_PUBLISH_DIR.mkdir(parents=True, exist_ok=True)
+    published = set()
+    for page_id in sorted(set(active_page_ids)):
+        if not (PAGES_DIR / page_id / "index.html").exists():
+            logger.warning(f"Not publishing page '{page_id}': its files are missing.")
+            continue
+        publish_page(page_id)
+        published.add(page_id)
+    removed = 0
+    for entry in STATIC_PUBLISH_DIR.iterdir():
+        # Dot-directories are locks and other processes' in-flight builds.
+        if entry.name.startswith(".") or not entry.is_dir() or entry.name in published:
+            continue
+        with _page_lock(entry.name):
+            # A page created after `active_page_ids` was read stays published.
+            if entry.exists() and not _is_active(entry.name):
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+    return len(published), removed
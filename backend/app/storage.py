@@ -0,0 +1,154 @@
+import os
+import re
+import hashlib
+import secrets
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from .rate_limit import acquire_upload_slot, check_rate_limit, release_upload_slot
+
+# --- File Storage Configuration ---
+CURRENT_FILE_DIR = Path(__file__).parent.resolve()
+PROJECT_ROOT = CURRENT_FILE_DIR.parent.parent.parent.resolve()
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", str(PROJECT_ROOT / "backend" / "uploads"))).resolve()
+PAGES_DIR = UPLOAD_DIR / "pages"
+
+# --- Upload Configuration ---
+CHUNK_SIZE = 1024 * 1024
+MAX_PAGE_UPLOAD_BYTES = int(os.getenv("MAX_PAGE_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_ASSET_UPLOAD_BYTES = int(os.getenv("MAX_ASSET_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Allowance for multipart boundaries and small form fields on top of the file itself.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def temp_path_for(path: Path) -> Path:
+    """Returns a hidden temp file next to `path`, so the final rename stays on one filesystem."""
+    return path.with_name(f".{path.name}.{secrets.token_hex(6)}.tmp")
+
+
+def new_staging_dir() -> Path:
+    """Creates a hidden directory under PAGES_DIR where a new page is assembled before it gets an ID."""
+    staging_dir = PAGES_DIR / f".staging-{secrets.token_hex(8)}"
+    staging_dir.mkdir(parents=True)
+    return staging_dir
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the maximum size of {max_bytes} bytes.")
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Writes `data` to a temp file and renames it over `path`, so readers never see a partial file."""
+    tmp_path = temp_path_for(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+async def save_upload_file(upload: UploadFile, dest: Path, max_bytes: int) -> Tuple[int, str]:
+    """Streams an upload to `dest` in chunks with an atomic rename.
+
+    Returns the number of bytes written and their SHA-256 hex digest. Raises a
+    413 as soon as more than `max_bytes` have been read.
+    """
+    tmp_path = temp_path_for(dest)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(max_bytes)
+                hasher.update(chunk)
+                await out.write(chunk)
+        await run_in_threadpool(os.replace, tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return size, hasher.hexdigest()
+
+
+async def read_upload_file(upload: UploadFile, max_bytes: int) -> bytes:
+    """Reads a whole upload into memory, refusing anything over `max_bytes`."""
+    chunks = []
+    size = 0
+    while chunk := await upload.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large(max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class UploadAdmissionMiddleware:
+    """ASGI middleware admitting uploads before their body is read.
+
+    FastAPI parses form and JSON bodies before any dependency runs, so upload
+    routes are guarded here instead. Requests whose credentials fail
+    `authenticate` get a 401, clients over their upload budget a 429, and
+    bodies over the route's size limit a 413: from Content-Length when one is
+    declared, otherwise as soon as the bytes received exceed it. Only an
+    authenticated upload takes an upload slot, held while its body is read and
+    processed.
+
+    `authenticate` raises an HTTPException for bad credentials. `routes` lists
+    (method, path regex, max upload bytes).
+    """
+
+    def __init__(self, app, authenticate: Callable[[Request], Awaitable[None]], routes: List[Tuple[str, str, int]]):
+        self.app = app
+        self.authenticate = authenticate
+        self.routes = [(method, re.compile(pattern), max_bytes) for method, pattern, max_bytes in routes]
+
+    def max_bytes_for(self, scope) -> Optional[int]:
+        for method, pattern, max_bytes in self.routes:
+            if scope["method"] == method and pattern.fullmatch(scope["path"]):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.max_bytes_for(scope) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        allowed = max_bytes + MULTIPART_OVERHEAD_BYTES
+        content_length = request.headers.get("content-length", "")
+        try:
+            await self.authenticate(request)
+            if content_length.isdigit() and int(content_length) > allowed:
+                raise too_large(max_bytes)
+            check_rate_limit("upload", request)
+            await acquire_upload_slot()
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > allowed:
+                    # Raised inside the body parser; FastAPI passes HTTPExceptions through as responses.
+                    raise too_large(max_bytes)
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            release_upload_slot()
@@ -0,0 +1,153 @@
+import os
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, select
+from starlette.concurrency import run_in_threadpool
+
+from .database import engine, Page
+from .analytics import add_hourly_views, truncate
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+VIEW_COUNT_FLUSH_INTERVAL = float(os.getenv("VIEW_COUNT_FLUSH_INTERVAL", "5"))
+VIEW_COUNT_FLUSH_THRESHOLD = int(os.getenv("VIEW_COUNT_FLUSH_THRESHOLD", "1000"))
+EXISTING_PAGES_QUERY_BATCH = 500 # IDs per IN (...) when checking which pages exist
+
+
+def _existing_page_ids(conn, page_ids: List[str]) -> Set[str]:
+    pages = Page.__table__
+    existing = set()
+    for start in range(0, len(page_ids), EXISTING_PAGES_QUERY_BATCH):
+        chunk = page_ids[start:start + EXISTING_PAGES_QUERY_BATCH]
+        existing.update(conn.scalars(select(pages.c.id).where(pages.c.id.in_(chunk))))
+    return existing
+
+
+class ViewCounter:
+    """Write-behind aggregator for page view counts.
+
+    Views are buffered in memory and written in one transaction, as a batched
+    UPDATE of `pages.view_count` and a batched upsert of the hourly
+    `page_view_buckets`, either every `flush_interval` seconds or as soon as
+    `flush_threshold` views are pending, whichever comes first. Views of IDs
+    that have no page (e.g. beacons for made-up IDs) are dropped on flush.
+    """
+
+    def __init__(self, flush_interval: float = VIEW_COUNT_FLUSH_INTERVAL, flush_threshold: int = VIEW_COUNT_FLUSH_THRESHOLD):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending: Counter = Counter()
+        self._pending_total = 0
+        self._in_flight: Counter = Counter()
+        # Keyed by (page_id, hour start)
+        self._pending_hours: Counter = Counter()
+        self._in_flight_hours: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, page_id: str, count: int = 1) -> None:
+        hour = truncate(datetime.now(), "hour")
+        with self._lock:
+            self._pending[page_id] += count
+            self._pending_hours[(page_id, hour)] += count
+            self._pending_total += count
+            threshold_reached = self._pending_total >= self.flush_threshold
+        if threshold_reached and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self, page_id: str) -> int:
+        with self._lock:
+            # Views being flushed are not yet visible in the database.
+            return self._pending.get(page_id, 0) + self._in_flight.get(page_id, 0)
+
+    def pending_hours(self, page_id: str) -> Dict[datetime, int]:
+        """Views of `page_id` not yet in `page_view_buckets`, by hour."""
+        hours: Counter = Counter()
+        with self._lock:
+            for buffer in (self._pending_hours, self._in_flight_hours):
+                for (pending_id, hour), count in buffer.items():
+                    if pending_id == page_id:
+                        hours[hour] += count
+        return hours
+
+    def pending_total(self) -> int:
+        with self._lock:
+            return self._pending_total + sum(self._in_flight.values())
+
+    def flush(self) -> int:
+        """Writes all pending views to the database. Returns the number of pages updated."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, hours = self._pending, self._pending_hours
+            self._in_flight, self._in_flight_hours = batch, hours
+            self._pending, self._pending_hours = Counter(), Counter()
+            self._pending_total = 0
+
+        pages = Page.__table__
+        stmt = (
+            pages.update()
+            .where(pages.c.id == bindparam("b_id"))
+            .values(view_count=pages.c.view_count + bindparam("b_delta"))
+        )
+        try:
+            with engine.begin() as conn:
+                existing = _existing_page_ids(conn, list(batch))
+                updates = [{"b_id": page_id, "b_delta": delta} for page_id, delta in batch.items() if page_id in existing]
+                if updates:
+                    conn.execute(stmt, updates)
+                add_hourly_views(conn, {key: count for key, count in hours.items() if key[0] in existing})
+        except Exception as e:
+            logger.error(f"Failed to flush view counts for {len(batch)} pages: {e}", exc_info=True)
+            with self._lock:
+                self._in_flight, self._in_flight_hours = Counter(), Counter()
+                self._pending.update(batch)
+                self._pending_hours.update(hours)
+                self._pending_total += sum(batch.values())
+            return 0
+        with self._lock:
+            self._in_flight, self._in_flight_hours = Counter(), Counter()
+        if len(existing) < len(batch):
+            logger.debug(f"Dropped views of {len(batch) - len(existing)} unknown page IDs.")
+        logger.debug(f"Flushed view counts for {len(existing)} pages.")
+        return len(existing)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await run_in_threadpool(self.flush)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await run_in_threadpool(self.flush)
+
+
+view_counter = ViewCounter()
@@ -0,0 +1,302 @@
+"""Offline benchmarks for the serving, listing and upload paths.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench [--json results.json] [--baseline previous.json]
+
+Requests go straight to the ASGI app in-process (no network or uvicorn), against
+a throwaway SQLite database and upload directory, so results are reproducible
+and measure the application itself. With --baseline, the run exits non-zero
+when any scenario's p50 or p99 latency regressed by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import random
+import platform
+import tempfile
+import itertools
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+ADMIN_USERNAME = "bench"
+ADMIN_PASSWORD = "bench-password"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def measure(name: str, send: Callable[[int], Awaitable], requests: int, concurrency: int, warmup: int) -> Dict:
+    """Issues `requests` calls of `send(i)` from `concurrency` workers and summarizes their latency."""
+    for i in range(warmup):
+        await send(-1 - i)
+
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "name": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def markdown_document(size: int, seed: int) -> str:
+    """A Markdown document of roughly `size` bytes; `seed` makes it unique so the render memo never hits."""
+    block = (
+        "## Section {n}\n\nSome *emphasis*, a [link](https://example.com/{n}) and `inline code`.\n\n"
+        "| key | value |\n| --- | --- |\n| a | {n} |\n\n```python\nprint({n})\n```\n\n"
+    )
+    parts = [f"# Benchmark document {seed}\n\n"]
+    length = len(parts[0])
+    for n in itertools.count():
+        part = block.format(n=n)
+        if length + len(part) > size:
+            break
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+# Made-up words for seeded page text, drawn with Zipf-like frequencies as in real prose
+SEED_VOCABULARY = [f"{syllable}{n}" for n in range(500) for syllable in ("ka", "mo", "ri", "tes")]
+SEED_WEIGHTS = [1 / (rank + 1) for rank in range(len(SEED_VOCABULARY))]
+SEED_BODY_WORDS = 150
+
+
+def seed_pages(engine, Page, PageSearchDocument, start: int, stop: int) -> None:
+    """Inserts pages start..stop-1 and their search documents directly, bypassing the upload path."""
+    from sqlalchemy import insert
+    base = datetime(2024, 1, 1)
+    pages, documents = [], []
+    with engine.begin() as conn:
+        for n in range(start, stop):
+            page_id = f"s{n:07d}"
+            pages.append({
+                "id": page_id,
+                "title": f"Seeded page {n}",
+                "file_path": None,
+                "created_at": base + timedelta(seconds=n),
+                "view_count": n % 1000,
+                "is_active": True,
+            })
+            words = random.Random(n).choices(SEED_VOCABULARY, SEED_WEIGHTS, k=SEED_BODY_WORDS)
+            documents.append({"page_id": page_id, "title": f"Seeded page {n}", "body": " ".join(words)})
+            if len(pages) >= 10000:
+                conn.execute(insert(Page), pages)
+                conn.execute(insert(PageSearchDocument), documents)
+                pages, documents = [], []
+        if pages:
+            conn.execute(insert(Page), pages)
+            conn.execute(insert(PageSearchDocument), documents)
+
+
+async def run(args) -> List[Dict]:
+    import httpx
+    from app.main import app
+    from app.database import engine, Page, PageSearchDocument
+
+    results = []
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post("/api/auth/login", auth=(ADMIN_USERNAME, ADMIN_PASSWORD))
+            login.raise_for_status()
+            token = login.json().get("token")
+            auth_headers = {"Authorization": f"Bearer {token}"} if token else {}
+            auth = None if token else (ADMIN_USERNAME, ADMIN_PASSWORD)
+
+            # --- Serving ---
+            created = await client.post(
+                "/api/upload/markdown", auth=auth, headers=auth_headers,
+                json={"markdown_content": markdown_document(16 * 1024, 0), "title": "Served page"},
+            )
+            created.raise_for_status()
+            page_id = created.json()["id"]
+            etag = (await client.get(f"/p/{page_id}/")).headers["etag"]
+
+            results.append(await measure(
+                "serve_page", lambda i: client.get(f"/p/{page_id}/"),
+                args.requests, args.concurrency, args.warmup,
+            ))
+            results.append(await measure(
+                "serve_page_gzip", lambda i: client.get(f"/p/{page_id}/", headers={"Accept-Encoding": "gzip, br"}),
+                args.requests, args.concurrency, args.warmup,
+            ))
+            results.append(await measure(
+                "serve_page_not_modified", lambda i: client.get(f"/p/{page_id}/", headers={"If-None-Match": etag}),
+                args.requests, args.concurrency, args.warmup,
+            ))
+
+            # --- Listing ---
+            seeded = 0
+            for page_count in args.page_counts:
+                await asyncio.to_thread(seed_pages, engine, Page, PageSearchDocument, seeded, page_count)
+                seeded = max(seeded, page_count)
+                first = await client.get("/api/pages", params={"limit": 50}, auth=auth, headers=auth_headers)
+                first.raise_for_status()
+                cursor = first.headers.get("x-next-cursor")
+                results.append(await measure(
+                    f"list_pages[{page_count}]",
+                    lambda i: client.get("/api/pages", params={"limit": 50}, auth=auth, headers=auth_headers),
+                    args.requests, args.concurrency, args.warmup,
+                ))
+                results.append(await measure(
+                    f"list_pages_next[{page_count}]",
+                    lambda i: client.get("/api/pages", params={"limit": 50, "cursor": cursor}, auth=auth, headers=auth_headers),
+                    args.requests, args.concurrency, args.warmup,
+                ))
+                results.append(await measure(
+                    f"list_pages_search[{page_count}]",
+                    lambda i: client.get("/api/pages", params={"limit": 50, "q": "page 99"}, auth=auth, headers=auth_headers),
+                    args.requests, args.concurrency, args.warmup,
+                ))
+                # Full-text search: a word in a few hundred pages, two common words, and a prefix.
+                for label, query in (("rare", "tes400"), ("common", "ka1 mo2"), ("prefix", "ri12")):
+                    results.append(await measure(
+                        f"search_pages_{label}[{page_count}]",
+                        lambda i, query=query: client.get("/api/pages/search", params={"q": query}, auth=auth, headers=auth_headers),
+                        args.requests, args.concurrency, args.warmup,
+                    ))
+
+            # --- Uploads ---
+            for size in args.markdown_sizes:
+                documents = {i: markdown_document(size, i + 1) for i in range(-args.warmup, args.upload_requests)}
+                results.append(await measure(
+                    f"upload_markdown[{size}]",
+                    lambda i: client.post(
+                        "/api/upload/markdown", auth=auth, headers=auth_headers,
+                        json={"markdown_content": documents[i], "title": f"Upload {i}"},
+                    ),
+                    args.upload_requests, args.concurrency, args.warmup,
+                ))
+
+            for size in args.asset_sizes:
+                payload = os.urandom(size)
+                results.append(await measure(
+                    f"upload_asset[{size}]",
+                    lambda i: client.post(
+                        f"/api/upload/asset/{page_id}", auth=auth, headers=auth_headers,
+                        files={"file": (f"asset-{size}-{i}.bin", payload, "application/octet-stream")},
+                    ),
+                    args.upload_requests, args.concurrency, args.warmup,
+                ))
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Returns a description of every scenario whose p50 or p99 grew by more than `tolerance`."""
+    previous = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if not before:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if before[key] > 0 and result[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{result['name']}: {key} {before[key]} -> {result[key]}")
+    return regressions
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"{'scenario':<34} {'req/s':>10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for result in results:
+        print(
+            f"{result['name']:<34} {result['rps']:>10} {result['mean_ms']:>10} "
+            f"{result['p50_ms']:>10} {result['p99_ms']:>10} {result['errors']:>7}"
+        )
+
+
+def int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per serving/listing scenario.")
+    parser.add_argument("--upload-requests", type=int, default=20, help="Requests per upload scenario.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each scenario.")
+    parser.add_argument("--page-counts", type=int_list, default=[1000, 10000, 100000])
+    parser.add_argument("--markdown-sizes", type=int_list, default=[1024, 16 * 1024, 256 * 1024])
+    parser.add_argument("--asset-sizes", type=int_list, default=[64 * 1024, 4 * 1024 * 1024])
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON to PATH ('-' for stdout).")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON results of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed latency increase over the baseline (0.2 = 20%%).")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="web-hosting-bench-") as work_dir:
+        # Configuration is read at import time, so it must be in place before app is imported.
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+        os.environ["UPLOAD_DIR"] = os.path.join(work_dir, "uploads")
+        os.environ["DEFAULT_ADMIN_USERNAME"] = ADMIN_USERNAME
+        os.environ["DEFAULT_ADMIN_PASSWORD"] = ADMIN_PASSWORD
+        os.environ["PAGE_VIEW_LOG_SAMPLE_RATE"] = "0"
+        os.environ["RATE_LIMIT_ENABLED"] = "false" # Measure the app, not the limiter
+        os.environ["AUTO_MIGRATE"] = "true"
+        logging.basicConfig(level=logging.WARNING)
+        logging.getLogger().setLevel(logging.WARNING)
+        started = time.time()
+        results = asyncio.run(run(args))
+
+    from app.main import __version__
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "duration_s": round(time.time() - started, 1),
+        "results": results,
+    }
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""Shared fixtures. Settings are read when the app is imported, so they are set here first."""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+WORK_DIR = tempfile.mkdtemp(prefix="web-hosting-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(WORK_DIR, "uploads")
+os.environ["AUTO_MIGRATE"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["MAX_PAGE_UPLOAD_BYTES"] = str(100 * 1024)
+os.environ["DEFAULT_ADMIN_USERNAME"] = "admin"
+os.environ["DEFAULT_ADMIN_PASSWORD"] = "adminpassword"
+os.environ["SESSION_SECRET"] = "test-session-secret"
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+AUTH = ("admin", "adminpassword")
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def create_page(client):
+    """Uploads a page from HTML (or Markdown) source and returns its ID."""
+    def create(content: str = "<h1>Hello</h1>", title: str = "Test page", markdown: bool = False) -> str:
+        if markdown:
+            response = client.post("/api/upload/markdown", json={"markdown_content": content, "title": title}, auth=AUTH)
+        else:
+            response = client.post("/api/upload/code", json={"html_content": content, "title": title}, auth=AUTH)
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    return create
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from app import auth_cache
+from app.auth_cache import AuthCache
+from app.cache_backend import MemoryBackend, SQLiteBackend
+
+from .conftest import AUTH
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def login(client) -> str:
+    response = client.post("/api/auth/login", auth=AUTH)
+    assert response.status_code == 200
+    return response.json()["token"]
+
+
+def test_session_token_authenticates(client):
+    token = login(client)
+    assert client.get("/api/pages", headers=bearer(token)).status_code == 200
+
+
+def test_tampered_session_token_is_rejected(client):
+    token = login(client)
+    payload, _, signature = token.partition(".")
+    forged = f"{payload}.{'A' * len(signature)}"
+    assert client.get("/api/pages", headers=bearer(forged)).status_code == 401
+    assert client.get("/api/pages", headers=bearer("not-a-token")).status_code == 401
+
+
+def test_password_change_revokes_session_tokens(client):
+    old_token = login(client)
+    response = client.put(
+        "/api/admin/password", json={"old_password": AUTH[1], "new_password": "changedpassword"}, auth=AUTH
+    )
+    assert response.status_code == 200
+    new_token = response.json()["token"]
+    try:
+        assert client.get("/api/pages", headers=bearer(old_token)).status_code == 401
+        assert client.get("/api/pages", headers=bearer(new_token)).status_code == 200
+    finally:
+        client.put(
+            "/api/admin/password", json={"old_password": "changedpassword", "new_password": AUTH[1]}, headers=bearer(new_token)
+        )
+    assert client.get("/api/pages", auth=AUTH).status_code == 200
+
+
+def test_session_tokens_are_off_without_a_secret():
+    env = {key: value for key, value in os.environ.items() if key not in ("SESSION_SECRET", "SESSION_TOKENS_ENABLED")}
+    code = "from app.session_tokens import SESSION_TOKENS_ENABLED; print(SESSION_TOKENS_ENABLED)"
+    backend_dir = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_auth_cache_matches_only_the_verified_credentials():
+    cache = AuthCache(ttl=60, max_entries=8, backend=MemoryBackend())
+
+    async def scenario():
+        await cache.add("admin", "secret", "hash-1")
+        assert await cache.is_verified("admin", "secret", "hash-1")
+        assert not await cache.is_verified("admin", "wrong", "hash-1")
+        assert not await cache.is_verified("admin", "secret", "hash-2")
+
+        cache.invalidate_user("admin")
+        assert not await cache.is_verified("admin", "secret", "hash-1")
+
+    asyncio.run(scenario())
+
+
+def test_auth_cache_entries_expire():
+    cache = AuthCache(ttl=0, backend=MemoryBackend())
+
+    async def scenario():
+        await cache.add("admin", "secret", "hash-1")
+        assert not await cache.is_verified("admin", "secret", "hash-1")
+
+    asyncio.run(scenario())
+
+
+def test_auth_cache_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    worker_a = AuthCache(ttl=60, backend=SQLiteBackend(path))
+    worker_b = AuthCache(ttl=60, backend=SQLiteBackend(path))
+
+    async def scenario():
+        await worker_a.add("admin", "secret", "hash-1")
+        assert await worker_b.is_verified("admin", "secret", "hash-1")
+        assert not await worker_b.is_verified("admin", "secret", "hash-2")
+
+    asyncio.run(scenario())
+
+
+def test_shared_auth_cache_needs_a_session_secret(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(auth_cache, "SESSION_SECRET_CONFIGURED", False)
+    path = str(tmp_path / "cache.db")
+    worker_a = AuthCache(ttl=60, backend=SQLiteBackend(path))
+    worker_b = AuthCache(ttl=60, backend=SQLiteBackend(path))
+    assert "SESSION_SECRET is not set" in caplog.text
+
+    async def scenario():
+        await worker_a.add("admin", "secret", "hash-1")
+        assert await worker_a.is_verified("admin", "secret", "hash-1")
+        assert not await worker_b.is_verified("admin", "secret", "hash-1")
+
+    asyncio.run(scenario())
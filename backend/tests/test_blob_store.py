@@ -0,0 +1,44 @@
+import os
+import time
+
+from app import blob_store
+
+
+def age(path, seconds: float) -> None:
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_reusing_a_blob_protects_it_from_collection(client):
+    digest = blob_store.put_blob(b"shared source")
+    path = blob_store.blob_path(digest)
+    age(path, blob_store.BLOB_GC_GRACE_SECONDS + 60)
+
+    # A new upload of the same content reuses the blob before its page row is committed.
+    assert blob_store.put_blob(b"shared source") == digest
+    assert blob_store.collect_garbage(referenced=[]) == (0, 0)
+    assert path.exists()
+
+
+def test_reusing_a_blob_from_a_file_protects_it_from_collection(client, tmp_path):
+    source = tmp_path / "upload"
+    source.write_bytes(b"shared file source")
+    digest = blob_store.put_blob(source.read_bytes())
+    age(blob_store.blob_path(digest), blob_store.BLOB_GC_GRACE_SECONDS + 60)
+
+    blob_store.put_blob_from_file(source, digest)
+    assert blob_store.collect_garbage(referenced=[]) == (0, 0)
+
+
+def test_unreferenced_old_blobs_are_collected(client):
+    digest = blob_store.put_blob(b"orphaned source")
+    path = blob_store.blob_path(digest)
+    age(path, blob_store.BLOB_GC_GRACE_SECONDS + 60)
+
+    assert blob_store.collect_garbage(referenced=[], dry_run=True)[0] >= 1
+    assert path.exists()
+    blob_store.collect_garbage(referenced=[])
+    assert not path.exists()
+    # A later upload of the same content writes the blob again.
+    assert blob_store.put_blob(b"orphaned source") == digest
+    assert path.read_bytes() == b"orphaned source"
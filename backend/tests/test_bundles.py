@@ -0,0 +1,66 @@
+import io
+import re
+import zipfile
+
+from .conftest import AUTH
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+
+
+def make_zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def upload_bundle(client, files: dict) -> dict:
+    response = client.post(
+        "/api/upload/bundle", files={"file": ("site.zip", make_zip(files), "application/zip")}, auth=AUTH
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def links(html: str) -> list:
+    return re.findall(r'(?:href|src)="([^"]*)"', html)
+
+
+def test_two_page_bundle_links_resolve(client):
+    result = upload_bundle(client, {
+        "index.html": (
+            '<link rel="stylesheet" href="css/site.css"><img src="img/logo.png"><img src="icons/logo.png">'
+            '<a href="docs/guide.md#setup">Guide</a><a href="https://example.com/">External</a>'
+        ),
+        "docs/guide.md": "# Guide\n\n[Home](../index.html) ![Diagram](diagram.png)\n",
+        "docs/diagram.png": PNG,
+        "css/site.css": "body { background: url('../img/bg.png'); }",
+        "img/logo.png": PNG,
+        "img/bg.png": PNG,
+        "icons/logo.png": PNG,
+    })
+    assert (result["pages"], result["assets"], result["skipped"]) == (2, 5, 0)
+    urls = {entry["path"]: entry["url"] for entry in result["entries"]}
+    assert urls["img/logo.png"] != urls["icons/logo.png"]
+
+    index = client.get(urls["index.html"]).text
+    assert links(index) == [
+        urls["css/site.css"], urls["img/logo.png"], urls["icons/logo.png"], urls["docs/guide.md"] + "#setup",
+        "https://example.com/",
+    ]
+    guide = client.get(urls["docs/guide.md"]).text
+    assert urls["index.html"] in links(guide)
+    assert urls["docs/diagram.png"] in links(guide)
+
+    stylesheet = client.get(urls["css/site.css"])
+    assert stylesheet.status_code == 200
+    assert f'url("{urls["img/bg.png"]}")' in stylesheet.text
+    for url in urls.values():
+        assert client.get(url).status_code == 200, url
+
+
+def test_asset_without_a_page_above_it_is_skipped(client):
+    result = upload_bundle(client, {"docs/index.html": "<p>docs</p>", "img/logo.png": PNG})
+    statuses = {entry["path"]: entry["status"] for entry in result["entries"]}
+    assert statuses == {"docs/index.html": "page", "img/logo.png": "skipped"}
@@ -0,0 +1,33 @@
+import os
+import time
+
+from app import compaction
+from app.compaction import CompactionReport, remove_orphan_directories
+from app.storage import PAGES_DIR
+
+
+def make_dir(name: str, age: float):
+    path = PAGES_DIR / name
+    path.mkdir(parents=True)
+    (path / "index.html").write_bytes(b"<p>x</p>")
+    moment = time.time() - age
+    os.utime(path, (moment, moment))
+    return path
+
+
+def test_orphan_directories_get_the_grace_period(client, create_page):
+    old = compaction.STAGING_GRACE_SECONDS + 60
+    # Moved into place by an upload that has not committed its page row yet.
+    uncommitted = make_dir("Qq1Qq1Qq1", age=0)
+    orphaned = make_dir("Ww2Ww2Ww2", age=old)
+    staging = make_dir(".staging-test-recent", age=0)
+    stale_staging = make_dir(".staging-test-stale", age=old)
+    page_dir = PAGES_DIR / create_page()
+    os.utime(page_dir, (time.time() - old,) * 2)
+
+    report = CompactionReport()
+    remove_orphan_directories(report, batch_size=100, dry_run=False)
+
+    assert uncommitted.exists() and staging.exists() and page_dir.exists()
+    assert not orphaned.exists() and not stale_staging.exists()
+    assert report.orphan_directories == 2
@@ -0,0 +1,71 @@
+from sqlalchemy import update
+
+from app import main
+from app.database import Page, engine
+
+from .conftest import AUTH
+
+
+def put_content(client, page_id: str, content: str, **headers):
+    return client.put(f"/api/pages/{page_id}/content", json={"content": content}, headers=headers, auth=AUTH)
+
+
+def test_if_match_with_current_version_updates(client, create_page):
+    page_id = create_page("<p>v1</p>")
+    assert client.get(f"/api/pages/{page_id}", auth=AUTH).headers["etag"] == '"1"'
+
+    response = put_content(client, page_id, "<p>v2</p>", **{"If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["etag"] == '"2"'
+    assert client.get(f"/p/{page_id}/").content == b"<p>v2</p>"
+
+
+def test_if_match_with_stale_version_is_rejected(client, create_page):
+    page_id = create_page("<p>v1</p>")
+    assert put_content(client, page_id, "<p>v2</p>").status_code == 200
+
+    response = put_content(client, page_id, "<p>stale edit</p>", **{"If-Match": '"1"'})
+    assert response.status_code == 412
+    assert client.get(f"/p/{page_id}/").content == b"<p>v2</p>"
+    assert put_content(client, page_id, "<p>v3</p>", **{"If-Match": "*"}).status_code == 200
+
+
+def test_update_that_loses_a_race_leaves_the_winner_in_place(client, create_page, monkeypatch):
+    page_id = create_page("<p>v1</p>")
+    get_active_page = main.get_active_page
+
+    async def read_then_concurrent_update(db, requested_id):
+        page = await get_active_page(db, requested_id)
+        # Another request updates the page after this one has read version 1.
+        with engine.begin() as conn:
+            conn.execute(update(Page).where(Page.id == requested_id).values(version=2))
+        return page
+
+    monkeypatch.setattr(main, "get_active_page", read_then_concurrent_update)
+    response = put_content(client, page_id, "<p>lost update</p>")
+    assert response.status_code == 409
+    monkeypatch.undo()
+
+    assert client.get(f"/p/{page_id}/").content == b"<p>v1</p>"
+    assert client.get(f"/api/pages/{page_id}", auth=AUTH).json()["version"] == 2
+
+
+def test_failed_commit_restores_the_previous_files(client, create_page, monkeypatch):
+    old, new = "<p>" + "old words " * 200 + "</p>", "<p>" + "new words " * 200 + "</p>"
+    page_id = create_page(old)
+    page_dir = main.PAGES_DIR / page_id
+    assert (page_dir / "index.html.gz").exists()
+
+    async def failing_index_pages(db, pages):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(main, "index_pages", failing_index_pages)
+    assert put_content(client, page_id, new).status_code == 500
+
+    assert (page_dir / "index.html").read_bytes() == old.encode()
+    gzipped = client.get(f"/p/{page_id}/", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.content == old.encode()
+    assert not [path.name for path in page_dir.iterdir() if path.name.startswith(".")]
+    assert client.get(f"/api/pages/{page_id}", auth=AUTH).json()["version"] == 1
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.images import optimize_image, select_variant, sniff_image_type
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_pillow_is_imported_only_when_an_image_is_processed():
+    code = "import sys, app.images; print('PIL' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_optimize_image_writes_smaller_variants(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (1200, 800), (200, 80, 40)).save(path, "JPEG")
+    assert sniff_image_type(path) == "image/jpeg"
+
+    info = optimize_image(path, "image/jpeg", tmp_path / "variants")
+    assert (info.width, info.height) == (1200, 800)
+    widths = sorted({variant["width"] for variant in info.variants})
+    assert widths[0] == 480 and widths[-1] <= 1200
+
+    variant = select_variant(info.variants, info.width, "image/webp,*/*", 500)
+    assert (variant["width"], variant["media_type"]) == (960, "image/webp")
+    assert select_variant(info.variants, info.width, "image/jpeg", 500)["media_type"] == "image/jpeg"
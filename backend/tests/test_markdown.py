@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import main, markdown_renderer
+from app.markdown_renderer import MarkdownRenderer
+
+from .conftest import AUTH
+
+# Thousands of identical headings take the toc extension minutes to give unique IDs.
+REPEATED_HEADINGS = "# a\n\n" * 5000
+
+
+def test_default_extensions_skip_toc():
+    assert "toc" not in markdown_renderer.MARKDOWN_EXTENSIONS
+    html = asyncio.run(MarkdownRenderer().render("# Title\n\n| a |\n|---|\n| b |"))
+    assert "<h1>Title</h1>" in html
+    assert "<table>" in html
+
+
+def test_repeated_headings_render_quickly_by_default(client):
+    response = client.post(
+        "/api/upload/markdown", json={"markdown_content": REPEATED_HEADINGS, "title": "headings"}, auth=AUTH
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_slow_pool_render_times_out_and_the_pool_recovers(monkeypatch):
+    monkeypatch.setattr(markdown_renderer, "MARKDOWN_PROCESS_THRESHOLD", 0)
+    monkeypatch.setattr(markdown_renderer, "MARKDOWN_RENDER_TIMEOUT", 2.0)
+    renderer = MarkdownRenderer(extensions=("toc",))
+
+    async def scenario():
+        with pytest.raises(HTTPException) as excinfo:
+            await renderer.render(REPEATED_HEADINGS)
+        assert excinfo.value.status_code == 422
+        assert renderer._executor is None
+        return await renderer.render("# Recovered")
+
+    try:
+        assert 'id="recovered"' in asyncio.run(scenario())
+    finally:
+        renderer.shutdown()
+
+
+def test_failed_render_leaves_no_staging_directory(client, monkeypatch):
+    async def render_timeout(text):
+        raise HTTPException(status_code=422, detail="Markdown took too long to render.")
+
+    monkeypatch.setattr(main.markdown_renderer, "render", render_timeout)
+    before = {path.name for path in main.PAGES_DIR.glob(".staging-*")}
+    response = client.post("/api/upload/markdown", json={"markdown_content": "# Hi", "title": "t"}, auth=AUTH)
+    assert response.status_code == 422
+    assert {path.name for path in main.PAGES_DIR.glob(".staging-*")} == before
@@ -0,0 +1,37 @@
+import re
+
+
+def counter_value(metrics: str, name: str, **labels) -> float:
+    """The value of the series `name` with exactly `labels`, or 0 if it has not been recorded."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(label_text)}\}} (\S+)$", metrics, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_requests_are_labelled_by_route_template(client, create_page):
+    page_id = create_page()
+    labels = {"method": "GET", "route": "/p/{page_id}/", "status": "200"}
+    before = counter_value(client.get("/metrics").text, "http_requests_total", **labels)
+
+    assert client.get(f"/p/{page_id}/").status_code == 200
+    metrics = client.get("/metrics").text
+    assert counter_value(metrics, "http_requests_total", **labels) == before + 1
+    assert page_id not in metrics
+
+
+def test_unmatched_paths_share_one_label(client):
+    labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = counter_value(client.get("/metrics").text, "http_requests_total", **labels)
+
+    for path in ("/no-such-path-1", "/no-such-path-2"):
+        assert client.get(path).status_code == 404
+    metrics = client.get("/metrics").text
+    assert counter_value(metrics, "http_requests_total", **labels) == before + 2
+    assert "no-such-path" not in metrics
+
+
+def test_latency_histogram_is_recorded_per_route(client):
+    client.get("/healthz")
+    metrics = client.get("/metrics").text
+    assert re.search(r'^http_request_duration_seconds_count\{method="GET",route="/healthz"\} [1-9]', metrics, re.MULTILINE)
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/healthz",le="+Inf"}' in metrics
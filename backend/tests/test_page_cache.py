@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+from app import page_cache as page_cache_module
+from app.cache_backend import MemoryBackend, SQLiteBackend
+from app.page_cache import CachedPage, PageCache, PageRecord
+
+from .conftest import AUTH
+
+
+def entry(page_id: str, generation: int, content: bytes = b"<p>x</p>") -> CachedPage:
+    return CachedPage(id=page_id, title=None, file_path="", content=content, generation=generation)
+
+
+def test_invalidate_turns_older_entries_into_misses():
+    cache = PageCache(backend=MemoryBackend())
+
+    async def scenario():
+        generation = await cache.generation("a")
+        cache.put(entry("a", generation))
+        assert cache.get("a", await cache.generation("a")) is not None
+        await cache.invalidate("a")
+        assert cache.get("a", await cache.generation("a")) is None
+
+    asyncio.run(scenario())
+
+
+def test_lru_eviction_respects_the_byte_budget():
+    cache = PageCache(max_entries=10, max_bytes=25, backend=MemoryBackend())
+    for page_id in "abc":
+        cache.put(entry(page_id, 0, b"x" * 10))
+    assert cache.get("a", 0) is None
+    assert cache.get("c", 0) is not None
+    assert cache.stats()["bytes"] <= 25
+
+
+def test_shared_generations_reach_other_workers_after_the_ttl(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(page_cache_module.time, "monotonic", lambda: clock[0])
+    path = str(tmp_path / "cache.db")
+    worker_a = PageCache(backend=SQLiteBackend(path), generation_ttl=1)
+    worker_b = PageCache(backend=SQLiteBackend(path), generation_ttl=1)
+    record = PageRecord(id="a", title="A", file_path="/tmp/a", etag='"e"', last_modified=datetime(2024, 1, 1), cache_control="no-cache")
+
+    async def scenario():
+        generation = await worker_b.generation("a")
+        await worker_a.put_record(record, generation)
+        assert await worker_b.get_record("a", generation) == record
+        worker_b.put(entry("a", generation))
+
+        await worker_a.invalidate("a")
+        assert await worker_a.generation("a") == generation + 1
+        # Worker B trusts the generation it read for PAGE_GENERATION_TTL seconds, then sees the update.
+        assert worker_b.get("a", await worker_b.generation("a")) is not None
+        clock[0] += 1.5
+        new_generation = await worker_b.generation("a")
+        assert new_generation == generation + 1
+        assert worker_b.get("a", new_generation) is None
+        assert await worker_b.get_record("a", generation) is None
+
+    asyncio.run(scenario())
+
+
+def test_updated_page_is_served_fresh(client, create_page):
+    page_id = create_page("<p>first</p>")
+    assert client.get(f"/p/{page_id}/").content == b"<p>first</p>"
+    response = client.put(f"/api/pages/{page_id}/content", json={"content": "<p>second</p>"}, auth=AUTH)
+    assert response.status_code == 200
+    assert client.get(f"/p/{page_id}/").content == b"<p>second</p>"
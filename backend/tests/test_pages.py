@@ -0,0 +1,96 @@
+import uuid
+
+import pytest
+
+from app import main
+from app.page_ids import page_id_allocator
+
+from .conftest import AUTH
+
+
+def list_all(client, **params):
+    """Follows X-Next-Cursor through every page of /api/pages, returning the rows and the number of requests."""
+    rows, requests, cursor = [], 0, None
+    while True:
+        response = client.get("/api/pages", params={**params, **({"cursor": cursor} if cursor else {})}, auth=AUTH)
+        assert response.status_code == 200, response.text
+        rows.extend(response.json())
+        requests += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return rows, requests
+
+
+@pytest.fixture
+def titled_pages(create_page):
+    """Five pages whose titles share a prefix no other test uses, oldest first."""
+    prefix = f"cursor-{uuid.uuid4().hex[:8]}"
+    return prefix, [create_page(title=f"{prefix} {n}") for n in range(5)]
+
+
+@pytest.mark.parametrize("sort", ["created_at", "view_count"])
+@pytest.mark.parametrize("order", ["desc", "asc"])
+def test_keyset_pagination_returns_every_page_once(client, titled_pages, sort, order):
+    prefix, page_ids = titled_pages
+    rows, requests = list_all(client, q=prefix, limit=2, sort=sort, order=order)
+    assert requests == 3
+    assert sorted(row["id"] for row in rows) == sorted(page_ids)
+
+    keys = [(row[sort], row["id"]) for row in rows]
+    assert keys == sorted(keys, reverse=(order == "desc"))
+
+
+def test_default_order_is_newest_first(client, titled_pages):
+    prefix, _ = titled_pages
+    default, _ = list_all(client, q=prefix, limit=2)
+    explicit, _ = list_all(client, q=prefix, limit=2, sort="created_at", order="desc")
+    assert default == explicit
+
+
+def test_title_search_escapes_like_wildcards(client, create_page):
+    marker = uuid.uuid4().hex[:8]
+    page_id = create_page(title=f"100% {marker}")
+    create_page(title=f"100x {marker}")
+    rows, _ = list_all(client, q=f"100% {marker}")
+    assert [row["id"] for row in rows] == [page_id]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "WzEsMl0"])
+def test_invalid_cursor_is_rejected(client, cursor):
+    response = client.get("/api/pages", params={"cursor": cursor}, auth=AUTH)
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def drawn_ids(monkeypatch):
+    """Makes the page ID allocator hand out the IDs appended to the returned list first, in order."""
+    ids = []
+    generate = page_id_allocator.generate
+    monkeypatch.setattr(page_id_allocator, "generate", lambda: ids.pop(0) if ids else generate())
+    return ids
+
+
+def test_colliding_page_id_is_drawn_again(client, create_page, drawn_ids):
+    existing = create_page("<p>existing</p>")
+    collisions = page_id_allocator.collisions
+    drawn_ids.extend([existing, "Fresh7"])
+
+    assert create_page("<p>new</p>") == "Fresh7"
+    assert page_id_allocator.collisions == collisions + 1
+    assert client.get(f"/p/{existing}/").content == b"<p>existing</p>"
+
+
+def test_leftover_directory_under_a_new_id_is_skipped(client, create_page, drawn_ids):
+    (main.PAGES_DIR / "Stale8").mkdir()
+    (main.PAGES_DIR / "Stale8" / "index.html").write_bytes(b"<p>leftover</p>")
+    drawn_ids.extend(["Stale8", "Fresh8"])
+
+    assert create_page("<p>new</p>") == "Fresh8"
+    assert client.get("/p/Stale8/").status_code == 404
+
+
+def test_page_id_allocation_gives_up_after_repeated_collisions(client, create_page, drawn_ids):
+    existing = create_page()
+    drawn_ids.extend([existing] * main.PAGE_ID_MAX_ATTEMPTS)
+    response = client.post("/api/upload/code", json={"html_content": "<p>x</p>"}, auth=AUTH)
+    assert response.status_code == 500
@@ -0,0 +1,84 @@
+import pytest
+from starlette.requests import Request
+
+from app import rate_limit
+from app.rate_limit import TokenBucketLimiter, client_ip, too_many_requests
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def request_from(peer: str, real_ip: str = None) -> Request:
+    headers = [(b"x-real-ip", real_ip.encode())] if real_ip else []
+    return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+
+def test_burst_is_allowed_then_clients_wait_for_a_refill(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=3)
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == pytest.approx(1.0)
+    # Other clients have their own bucket.
+    assert limiter.acquire("b") == 0
+
+    clock.now += 1.0
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+
+
+def test_buckets_never_exceed_the_burst(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=2)
+    limiter.acquire("a")
+    clock.now += 3600
+    assert [limiter.acquire("a") for _ in range(3)][-1] > 0
+
+
+def test_tracked_clients_are_bounded(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=5, max_keys=10)
+    for n in range(100):
+        limiter.acquire(f"client-{n}")
+        clock.now += 0.01
+    assert len(limiter) <= 10
+
+
+def test_least_recently_seen_client_is_evicted_first(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=2, max_keys=3)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+        clock.now += 0.01
+    limiter.acquire("a")
+    limiter.acquire("a")
+    limiter.acquire("d")
+    assert len(limiter) == 3
+    # "a" is still remembered as exhausted; "b" was evicted and starts with a full burst.
+    assert limiter.acquire("a") > 0
+    assert [limiter.acquire("b") for _ in range(2)] == [0, 0]
+
+
+def test_retry_after_is_finite_for_a_zero_budget():
+    limiter = TokenBucketLimiter("test", per_minute=0, burst=0)
+    assert too_many_requests(limiter.acquire("a")).headers["Retry-After"] == "3600"
+
+
+def test_x_real_ip_is_only_trusted_from_proxies():
+    assert client_ip(request_from("127.0.0.1", "203.0.113.7")) == "203.0.113.7"
+    assert client_ip(request_from("198.51.100.1", "203.0.113.7")) == "198.51.100.1"
+    assert client_ip(request_from("127.0.0.1")) == "127.0.0.1"
+
+
+def test_failed_password_checks_are_rate_limited(client, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "limiters", {**rate_limit.limiters, "auth": TokenBucketLimiter("auth", 1, 2)})
+    statuses = [client.post("/api/auth/login", auth=("admin", "wrong-password")).status_code for _ in range(3)]
+    assert statuses == [401, 401, 429]
@@ -0,0 +1,77 @@
+import uuid
+
+from sqlalchemy import update
+
+from app import search
+from app.database import Page, engine
+
+from .conftest import AUTH
+
+
+def search_ids(client, q: str) -> list:
+    response = client.get("/api/pages/search", params={"q": q}, auth=AUTH)
+    assert response.status_code == 200, response.text
+    return [hit["id"] for hit in response.json()]
+
+
+def unique_word() -> str:
+    return f"w{uuid.uuid4().hex[:10]}"
+
+
+def test_new_page_is_searchable_by_content_and_title(client, create_page):
+    body, title = unique_word(), unique_word()
+    page_id = create_page(f"<p>{body}</p>", title=f"Notes {title}")
+    assert search_ids(client, body) == [page_id]
+    assert search_ids(client, title) == [page_id]
+
+
+def test_updated_content_replaces_old_words(client, create_page):
+    old, new = unique_word(), unique_word()
+    page_id = create_page(f"<p>{old}</p>")
+    response = client.put(f"/api/pages/{page_id}/content", json={"content": f"<p>{new}</p>"}, auth=AUTH)
+    assert response.status_code == 200, response.text
+    assert search_ids(client, old) == []
+    assert search_ids(client, new) == [page_id]
+
+
+def test_deleted_page_leaves_the_index(client, create_page):
+    word = unique_word()
+    page_id = create_page(f"<p>{word}</p>")
+    assert client.delete(f"/api/pages/{page_id}", auth=AUTH).status_code == 200
+    assert search_ids(client, word) == []
+
+
+def test_snippet_escapes_html_and_marks_matches(client, create_page):
+    word = unique_word()
+    create_page(f"<pre>a &lt;script&gt; tag near {word}</pre>")
+    response = client.get("/api/pages/search", params={"q": word}, auth=AUTH)
+    snippet = response.json()[0]["snippet"]
+    assert f"<mark>{word}</mark>" in snippet
+    assert "&lt;script&gt;" in snippet
+    assert "<script>" not in snippet
+    assert search.MATCH_START not in snippet and search.MATCH_END not in snippet
+
+
+def test_last_word_matches_as_prefix(client, create_page):
+    word = unique_word()
+    page_id = create_page(f"<p>{word}</p>")
+    assert search_ids(client, word[:-3]) == [page_id]
+
+
+def test_old_title_match_outranks_newer_body_matches(client, create_page):
+    word = unique_word()
+    title_match = create_page("<p>other text</p>", title=f"About {word}")
+    for _ in range(3):
+        create_page(f"<p>{word}</p>")
+    response = client.get("/api/pages/search", params={"q": word, "limit": 1}, auth=AUTH)
+    assert [hit["id"] for hit in response.json()] == [title_match]
+
+
+def test_inactive_pages_do_not_shorten_a_page_of_results(client, create_page):
+    word = unique_word()
+    page_ids = [create_page(f"<p>{word}</p>") for _ in range(3)]
+    # Deactivated directly, so its search document is still in the index.
+    with engine.begin() as conn:
+        conn.execute(update(Page).where(Page.id == page_ids[0]).values(is_active=False))
+    response = client.get("/api/pages/search", params={"q": word, "limit": 2}, auth=AUTH)
+    assert sorted(hit["id"] for hit in response.json()) == sorted(page_ids[1:])
@@ -0,0 +1,116 @@
+from urllib.parse import urljoin
+
+import pytest
+
+from app import main
+
+from .conftest import AUTH
+
+
+def upload_asset(client, page_id: str, name: str, content: bytes, content_type: str = "application/octet-stream"):
+    response = client.post(f"/api/upload/asset/{page_id}", files={"file": (name, content, content_type)}, auth=AUTH)
+    assert response.status_code == 200, response.text
+
+
+def test_page_url_has_trailing_slash(client):
+    response = client.post("/api/upload/code", json={"html_content": "<p>hi</p>", "title": "t"}, auth=AUTH)
+    assert response.json()["url"] == f"/p/{response.json()['id']}/"
+
+
+def test_page_without_trailing_slash_redirects_permanently(client, create_page):
+    page_id = create_page()
+    response = client.get(f"/p/{page_id}?ref=home", follow_redirects=False)
+    assert response.status_code == 301
+    assert response.headers["location"] == f"/p/{page_id}/?ref=home"
+
+
+def test_relative_asset_url_resolves_from_page(client, create_page):
+    page_id = create_page('<img src="assets/logo.txt">')
+    upload_asset(client, page_id, "logo.txt", b"logo bytes", "text/plain")
+
+    page = client.get(f"/p/{page_id}")
+    assert page.status_code == 200
+    assert page.history and page.history[0].status_code == 301
+
+    asset = client.get(urljoin(str(page.url), "assets/logo.txt"))
+    assert asset.status_code == 200
+    assert asset.content == b"logo bytes"
+
+
+def test_asset_range_request(client, create_page):
+    page_id = create_page()
+    upload_asset(client, page_id, "data.bin", bytes(range(100)))
+
+    response = client.get(f"/p/{page_id}/assets/data.bin", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10, 20))
+    assert response.headers["content-range"] == "bytes 10-19/100"
+
+
+@pytest.mark.parametrize("name, encoded", [("報告.pdf", "%E5%A0%B1%E5%91%8A.pdf"), ("my file.pdf", "my%20file.pdf")])
+def test_x_accel_redirect_path_is_percent_encoded(client, create_page, monkeypatch, name, encoded):
+    page_id = create_page()
+    upload_asset(client, page_id, name, b"%PDF-1.4", "application/pdf")
+    monkeypatch.setattr(main, "ASSET_X_ACCEL_PREFIX", "/_protected/")
+
+    response = client.get(f"/p/{page_id}/assets/{name}")
+    assert response.status_code == 200
+    assert response.headers["x-accel-redirect"] == f"/_protected/{page_id}/assets/{encoded}"
+
+
+def test_matching_if_none_match_gets_a_304(client, create_page):
+    page_id = create_page("<p>cached</p>")
+    first = client.get(f"/p/{page_id}/", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+
+    response = client.get(f"/p/{page_id}/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert client.get(f"/p/{page_id}/", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_modified_since_gets_a_304_until_the_page_changes(client, create_page):
+    page_id = create_page("<p>v1</p>")
+    last_modified = client.get(f"/p/{page_id}/").headers["last-modified"]
+    assert client.get(f"/p/{page_id}/", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    etag = client.get(f"/p/{page_id}/").headers["etag"]
+    response = client.put(f"/api/pages/{page_id}/content", json={"content": "<p>v2</p>"}, auth=AUTH)
+    assert response.status_code == 200
+    response = client.get(f"/p/{page_id}/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content == b"<p>v2</p>"
+
+
+LARGE_PAGE = "<p>" + "compressible text " * 200 + "</p>"
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_precompressed_variant_matches_accept_encoding(client, create_page, encoding):
+    if encoding == "br":
+        pytest.importorskip("brotli")
+    page_id = create_page(LARGE_PAGE)
+    suffix = {"gzip": ".gz", "br": ".br"}[encoding]
+    assert (main.PAGES_DIR / page_id / f"index.html{suffix}").exists()
+
+    response = client.get(f"/p/{page_id}/", headers={"Accept-Encoding": encoding})
+    assert response.headers["content-encoding"] == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].endswith(f'-{encoding}"')
+    assert response.text == LARGE_PAGE
+
+
+def test_identity_is_sent_without_an_accepted_encoding(client, create_page):
+    page_id = create_page(LARGE_PAGE)
+    response = client.get(f"/p/{page_id}/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == LARGE_PAGE
+
+
+def test_small_page_has_no_compressed_variant(client, create_page):
+    page_id = create_page("<p>tiny</p>")
+    assert not (main.PAGES_DIR / page_id / "index.html.gz").exists()
+    response = client.get(f"/p/{page_id}/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import main, static_publish
+
+from .conftest import AUTH
+
+
+@pytest.fixture
+def publish_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_publish, "STATIC_PUBLISH_DIR", tmp_path)
+    monkeypatch.setattr(main, "STATIC_PUBLISH_DIR", tmp_path)
+    return tmp_path
+
+
+def test_upload_publishes_and_delete_unpublishes(client, create_page, publish_dir):
+    page_id = create_page("<p>published</p>")
+    assert (publish_dir / page_id / "index.html").read_bytes() == b"<p>published</p>"
+
+    assert client.delete(f"/api/pages/{page_id}", auth=AUTH).status_code == 200
+    assert not (publish_dir / page_id).exists()
+
+
+def test_publish_after_delete_does_not_republish(client, create_page, publish_dir):
+    page_id = create_page()
+    assert client.delete(f"/api/pages/{page_id}", auth=AUTH).status_code == 200
+    # A publish from an update that read the page before it was deleted.
+    static_publish.publish_page(page_id)
+    assert not (publish_dir / page_id).exists()
+
+
+def test_concurrent_publishes_of_a_page_all_succeed(create_page, publish_dir):
+    page_id = create_page("<p>concurrent</p>")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for future in [pool.submit(static_publish.publish_page, page_id) for _ in range(16)]:
+            future.result()
+    assert (publish_dir / page_id / "index.html").read_bytes() == b"<p>concurrent</p>"
+    assert sorted(entry.name for entry in publish_dir.iterdir()) == [".locks", page_id]
+
+
+def test_rebuild_removes_stale_pages_and_keeps_in_flight_builds(create_page, publish_dir):
+    page_id = create_page()
+    stale = publish_dir / "stale-page"
+    in_flight = publish_dir / f".{page_id}.abcdef.tmp"
+    for directory in (stale, in_flight):
+        directory.mkdir()
+
+    assert static_publish.rebuild([page_id]) == (1, 1)
+    assert (publish_dir / page_id / "index.html").exists()
+    assert not stale.exists()
+    assert in_flight.exists()
@@ -0,0 +1,63 @@
+from app import rate_limit, storage
+from app.storage import MAX_PAGE_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES
+
+from .conftest import AUTH
+
+OVERSIZED = b"x" * (MAX_PAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES + 1)
+
+
+def test_upload_code_creates_page(client, create_page):
+    page_id = create_page("<p>content</p>")
+    response = client.get(f"/p/{page_id}/")
+    assert response.status_code == 200
+    assert b"<p>content</p>" in response.content
+
+
+def test_oversized_body_is_rejected_from_content_length(client):
+    response = client.post(
+        "/api/upload/code", content=OVERSIZED, headers={"Content-Type": "application/json"}, auth=AUTH
+    )
+    assert response.status_code == 413
+
+
+def test_oversized_body_without_content_length_is_rejected_while_streaming(client):
+    def chunks():
+        for start in range(0, len(OVERSIZED), 64 * 1024):
+            yield OVERSIZED[start:start + 64 * 1024]
+
+    response = client.post(
+        "/api/upload/code", content=chunks(), headers={"Content-Type": "application/json"}, auth=AUTH
+    )
+    assert response.status_code == 413
+
+
+def test_unauthenticated_upload_is_rejected_before_the_body(client):
+    response = client.post("/api/upload/code", content=OVERSIZED, headers={"Content-Type": "application/json"})
+    assert response.status_code == 401
+
+
+def test_wrong_credentials_never_take_an_upload_slot(client, monkeypatch):
+    acquired = []
+
+    async def acquire():
+        acquired.append(True)
+
+    monkeypatch.setattr(storage, "acquire_upload_slot", acquire)
+    response = client.post("/api/upload/code", json={"html_content": "<p>x</p>"}, auth=("admin", "wrong-password"))
+    assert response.status_code == 401
+    response = client.post("/api/upload/code", json={"html_content": "<p>x</p>"}, headers={"Authorization": "Basic x"})
+    assert response.status_code == 401
+    assert acquired == []
+
+
+def test_oversized_multipart_upload_is_rejected(client):
+    response = client.post("/api/upload/html", files={"file": ("big.md", OVERSIZED, "text/markdown")}, auth=AUTH)
+    assert response.status_code == 413
+
+
+def test_upload_rate_limit_applies_before_the_body(client, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "limiters", {**rate_limit.limiters, "upload": rate_limit.TokenBucketLimiter("upload", 1, 0)})
+    response = client.post("/api/upload/code", json={"html_content": "<p>x</p>"}, auth=AUTH)
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
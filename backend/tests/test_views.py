@@ -0,0 +1,50 @@
+from sqlalchemy import func, select
+
+from app import rate_limit
+from app.database import PageViewBucket, SessionLocal, Page
+from app.view_counter import view_counter
+
+
+def stored_views(page_id: str):
+    """(pages.view_count, sum of page_view_buckets) for a page, after flushing pending views."""
+    view_counter.flush()
+    with SessionLocal() as db:
+        count = db.scalar(select(Page.view_count).where(Page.id == page_id))
+        buckets = db.scalar(select(func.coalesce(func.sum(PageViewBucket.views), 0)).where(PageViewBucket.page_id == page_id))
+    return count, buckets
+
+
+def test_serving_a_page_counts_a_view(client, create_page):
+    page_id = create_page()
+    client.get(f"/p/{page_id}/")
+    client.get(f"/p/{page_id}/")
+    assert stored_views(page_id) == (2, 2)
+
+
+def test_beacon_counts_a_view_of_an_existing_page(client, create_page):
+    page_id = create_page()
+    assert client.get(f"/api/beacon/p/{page_id}/").status_code == 204
+    assert stored_views(page_id) == (1, 1)
+
+
+def test_beacon_views_of_unknown_pages_are_dropped(client):
+    assert client.get("/api/beacon/p/Zz9Zz9Zz9/").status_code == 204
+    assert stored_views("Zz9Zz9Zz9") == (None, 0)
+    assert view_counter.pending_total() == 0
+
+
+def test_beacon_rejects_malformed_page_ids(client):
+    view_counter.flush()
+    assert client.get("/api/beacon/p/not-a-page-id/").status_code == 404
+    assert client.get("/api/beacon/p/abc/assets/x.png").status_code == 404
+    assert view_counter.pending_total() == 0
+
+
+def test_beacon_is_rate_limited(client, create_page, monkeypatch):
+    page_id = create_page()
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "limiters", {**rate_limit.limiters, "serve": rate_limit.TokenBucketLimiter("serve", 1, 0)})
+    response = client.get(f"/api/beacon/p/{page_id}/")
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+    assert view_counter.pending(page_id) == 0
@@ -1,5 +1,6 @@
 import { createApp } from "vue";
 import { createPinia } from "pinia";
+import axios from "axios";
 import ElementPlus from "element-plus";
 import "element-plus/dist/index.css";
 import "element-plus/theme-chalk/dark/css-vars.css";
@@ -7,11 +8,30 @@ import "./assets/main.css";
 
 import App from "./App.vue";
 import router from "./router";
+import { useAuthStore } from "./stores/auth";
 
 const app = createApp(App);
 const pinia = createPinia();
 
 app.use(pinia);
+
+// Session tokens expire, and are rejected after the backend's secret changes.
+axios.interceptors.response.use(undefined, async (error) => {
+  if (error.response?.status !== 401) {
+    throw error;
+  }
+  const authStore = useAuthStore();
+  const wasAuthenticated = authStore.isAuthenticated;
+  try {
+    return await authStore.handleUnauthorized(error);
+  } catch (err) {
+    if (wasAuthenticated && !authStore.isAuthenticated) {
+      router.push({ name: "login" });
+    }
+    throw err;
+  }
+});
+
 app.use(router);
 app.use(ElementPlus);
 
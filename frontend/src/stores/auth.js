@@ -6,6 +6,7 @@ export const useAuthStore = defineStore("auth", {
     isAuthenticated: localStorage.getItem("isAuthenticated") === "true",
     username: localStorage.getItem("username") || null,
     basicAuthToken: localStorage.getItem("basicAuthToken") || null, // Store the base64 token
+    sessionToken: localStorage.getItem("sessionToken") || null, // Signed token issued by the backend, if enabled
     error: null,
   }),
   actions: {
@@ -27,6 +28,7 @@ export const useAuthStore = defineStore("auth", {
           localStorage.setItem("isAuthenticated", "true");
           localStorage.setItem("username", username);
           localStorage.setItem("basicAuthToken", credentials); // Persist the token
+          this.setSessionToken(response.data.token);
           return true;
         }
       } catch (err) {
@@ -36,6 +38,7 @@ export const useAuthStore = defineStore("auth", {
         localStorage.removeItem("isAuthenticated");
         localStorage.removeItem("username");
         localStorage.removeItem("basicAuthToken");
+        this.setSessionToken(null);
         if (err.response) {
           this.error =
             err.response.data.detail ||
@@ -56,6 +59,7 @@ export const useAuthStore = defineStore("auth", {
       localStorage.removeItem("isAuthenticated");
       localStorage.removeItem("username");
       localStorage.removeItem("basicAuthToken");
+      this.setSessionToken(null);
     },
 
     async changePassword(oldPassword, newPassword) {
@@ -76,6 +80,7 @@ export const useAuthStore = defineStore("auth", {
           const newCredentials = btoa(`${this.username}:${newPassword}`);
           this.basicAuthToken = newCredentials;
           localStorage.setItem("basicAuthToken", newCredentials);
+          this.setSessionToken(response.data.token);
           return true;
         }
       } catch (err) {
@@ -104,6 +109,7 @@ export const useAuthStore = defineStore("auth", {
           this.basicAuthToken = newCredentials;
           localStorage.setItem("username", newUsername);
           localStorage.setItem("basicAuthToken", newCredentials);
+          this.setSessionToken(response.data.token);
           return true;
         }
       } catch (err) {
@@ -111,7 +117,35 @@ export const useAuthStore = defineStore("auth", {
         return false;
       }
     },
+    setSessionToken(token) {
+      this.sessionToken = token || null;
+      if (this.sessionToken) {
+        localStorage.setItem("sessionToken", this.sessionToken);
+      } else {
+        localStorage.removeItem("sessionToken");
+      }
+    },
+    // Called for a 401 on a request made with getAuthHeader(). An expired or
+    // rejected session token is dropped and the request retried with Basic
+    // credentials; if those are rejected too, the user is logged out.
+    async handleUnauthorized(error) {
+      const config = error.config;
+      const authorization = config?.headers?.Authorization || "";
+      if (authorization.startsWith("Bearer ") && this.basicAuthToken) {
+        this.setSessionToken(null);
+        config.headers.Authorization = `Basic ${this.basicAuthToken}`;
+        return axios(config);
+      }
+      if (authorization && config.url !== "/api/auth/login") {
+        this.logout();
+      }
+      throw error;
+    },
     getAuthHeader() {
+      // Session tokens let the backend skip the bcrypt check on every request.
+      if (this.isAuthenticated && this.sessionToken) {
+        return { Authorization: `Bearer ${this.sessionToken}` };
+      }
       if (this.isAuthenticated && this.basicAuthToken) {
         return { Authorization: `Basic ${this.basicAuthToken}` };
       }
@@ -9,6 +9,13 @@ PIDS_FILE="$SCRIPT_DIR/pids.txt"
 
 echo "Starting frontend and backend services..."
 
+# --- Migrate Database ---
+# Runs before anything starts, so a failed migration stops the script with its errors shown.
+(cd "$BACKEND_DIR" && "$BACKEND_DIR/.venv/bin/python" -m app.cli migrate) || {
+    echo "Error: Database migration failed; not starting the services." >&2
+    exit 1
+}
+
 # Clear previous PIDs file
 > "$PIDS_FILE" # Create/truncate the file before writing
 